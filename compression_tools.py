@@ -0,0 +1,282 @@
+"""
+# Shared compression tools module
+
+# to import:
+from compression_tools import get_codec, get_codec_for_filename, is_compressed_filename
+
+# Example usage:
+    codec = get_codec("gzip")
+    with codec.open("file_2023_12_25.json.gz", "wb", level=6) as f:
+        f.write(data_bytes)
+
+    compressed_bytes = get_codec("zstd").compress(data_bytes)
+
+# gzip, bz2 and xz are always available (stdlib)
+# zstd and lz4 are only available when their modules are installed:
+    pip install zstandard lz4
+
+# Run this as a script for a ratio/throughput benchmark of each available codec:
+    python compression_tools.py [optional_sample.json]
+"""
+from abc import ABC, abstractmethod
+import bz2
+import gzip
+import json
+import lzma
+import sys
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+class CompressionCodec(ABC):
+    # base class, one subclass per compression format
+    name = ""
+    extension = ""
+    default_level = None
+    # True if a file of back-to-back compressed members decompresses to the joined data
+    # (this is what allows block-parallel compression)
+    supports_concatenation = False
+
+    @abstractmethod
+    def open(self, filename: str, mode: str = "rb", level: int | None = None):
+        ...
+
+    @abstractmethod
+    def compress(self, data: bytes, level: int | None = None) -> bytes:
+        ...
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+    def _level(self, level: int | None) -> int | None:
+        return self.default_level if level is None else level
+
+
+class GzipCodec(CompressionCodec):
+    name = "gzip"
+    extension = ".gz"
+    default_level = 9  # gzip module default, kept for backwards compatibility
+    supports_concatenation = True
+
+    def open(self, filename, mode="rb", level=None):
+        if "r" in mode:
+            return gzip.open(filename, mode)
+        return gzip.open(filename, mode, compresslevel=self._level(level))
+
+    def compress(self, data, level=None):
+        return gzip.compress(data, compresslevel=self._level(level))
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+
+class Bz2Codec(CompressionCodec):
+    name = "bz2"
+    extension = ".bz2"
+    default_level = 9
+    supports_concatenation = True
+
+    def open(self, filename, mode="rb", level=None):
+        if "r" in mode:
+            return bz2.open(filename, mode)
+        return bz2.open(filename, mode, compresslevel=self._level(level))
+
+    def compress(self, data, level=None):
+        return bz2.compress(data, compresslevel=self._level(level))
+
+    def decompress(self, data):
+        return bz2.decompress(data)
+
+
+class XzCodec(CompressionCodec):
+    name = "xz"
+    extension = ".xz"
+    default_level = 6
+    supports_concatenation = True
+
+    def open(self, filename, mode="rb", level=None):
+        if "r" in mode:
+            return lzma.open(filename, mode)
+        return lzma.open(filename, mode, preset=self._level(level))
+
+    def compress(self, data, level=None):
+        return lzma.compress(data, preset=self._level(level))
+
+    def decompress(self, data):
+        return lzma.decompress(data)
+
+
+class ZstdCodec(CompressionCodec):
+    name = "zstd"
+    extension = ".zst"
+    default_level = 3
+    # the zstd CLI decodes concatenated frames, but zstandard.open() and decompress() stop after
+    # the first frame by default, so chunked compression falls back to a single stream
+    supports_concatenation = False
+
+    def open(self, filename, mode="rb", level=None):
+        if "r" in mode:
+            return zstandard.open(filename, mode)
+        cctx = zstandard.ZstdCompressor(level=self._level(level))
+        return zstandard.open(filename, mode, cctx=cctx)
+
+    def compress(self, data, level=None):
+        return zstandard.ZstdCompressor(level=self._level(level)).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class Lz4Codec(CompressionCodec):
+    name = "lz4"
+    extension = ".lz4"
+    default_level = 0
+    # lz4.frame.decompress() only decodes the first frame, so chunked compression falls back to a single stream
+    supports_concatenation = False
+
+    def open(self, filename, mode="rb", level=None):
+        if "r" in mode:
+            return lz4.frame.open(filename, mode)
+        return lz4.frame.open(filename, mode, compression_level=self._level(level))
+
+    def compress(self, data, level=None):
+        return lz4.frame.compress(data, compression_level=self._level(level))
+
+    def decompress(self, data):
+        return lz4.frame.decompress(data)
+
+
+# every codec we know about, available or not
+ALL_CODECS = {
+    codec.name: codec
+    for codec in [GzipCodec(), Bz2Codec(), XzCodec(), ZstdCodec(), Lz4Codec()]
+}
+
+# codecs that can actually be used in this environment
+CODECS = {name: codec for name, codec in ALL_CODECS.items()}
+if zstandard is None:
+    CODECS.pop("zstd")
+if lz4 is None:
+    CODECS.pop("lz4")
+
+# extensions we treat as "already compressed", whether or not the codec is installed
+COMPRESSED_EXTENSIONS = [codec.extension for codec in ALL_CODECS.values()] + [".zip"]
+
+
+def get_codec(name: str = "gzip") -> CompressionCodec:
+    """
+    Returns the codec registered as name ('gzip', 'bz2', 'xz', 'zstd', 'lz4')
+    Raises an Exception if the codec is unknown or its module is not installed
+    """
+    if name in CODECS:
+        return CODECS[name]
+    if name in ALL_CODECS:
+        raise Exception(f"Compression codec '{name}' is not available, install its module to use it")
+    raise Exception(f"Unknown compression codec '{name}', choose one of {list(ALL_CODECS)}")
+
+
+def get_codec_for_filename(filename: str) -> CompressionCodec | None:
+    """
+    Returns the codec matching a filename's extension, e.g., 'file.json.zst' -> zstd
+    or None if the file does not have a known (and available) compressed extension
+    """
+    for codec in CODECS.values():
+        if str(filename).endswith(codec.extension):
+            return codec
+    return None
+
+
+def is_compressed_filename(filename: str) -> bool:
+    """
+    Returns True if filename ends with any known compressed extension (.gz .bz2 .xz .zst .lz4 .zip)
+    """
+    return any(str(filename).endswith(extension) for extension in COMPRESSED_EXTENSIONS)
+
+
+def benchmark_codecs(data: bytes, levels: dict | None = None, repeat: int = 3) -> list:
+    """
+    Compare compression ratio and throughput of each available codec on data
+
+    Args:
+        data (bytes): sample payload
+        levels (dict, optional): {codec_name: [level, ...]} to benchmark.
+            Defaults to a few typical levels for each available codec
+        repeat (int, optional): best-of-N timing. Defaults to 3.
+
+    Returns:
+        list: one dict per codec/level with ratio and compress/decompress MB/s
+    """
+    if levels is None:
+        levels = {
+            "gzip": [1, 6, 9],
+            "bz2": [9],
+            "xz": [6],
+            "zstd": [1, 3, 9],
+            "lz4": [0],
+        }
+    size_mb = len(data) / (1024 * 1024)
+    results = []
+    for name, codec_levels in levels.items():
+        if name not in CODECS:
+            continue
+        codec = CODECS[name]
+        for level in codec_levels:
+            compress_time = float("inf")
+            decompress_time = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                compressed = codec.compress(data, level=level)
+                compress_time = min(compress_time, time.perf_counter() - start)
+                start = time.perf_counter()
+                codec.decompress(compressed)
+                decompress_time = min(decompress_time, time.perf_counter() - start)
+            results.append(
+                {
+                    "codec": name,
+                    "level": level,
+                    "ratio": round(len(data) / len(compressed), 2),
+                    "compress_mb_s": round(size_mb / compress_time, 1),
+                    "decompress_mb_s": round(size_mb / decompress_time, 1),
+                }
+            )
+    return results
+
+
+def _sample_json_payload(records: int = 20000) -> bytes:
+    # roughly the shape of our endpoint exports
+    endpoints = [
+        {
+            "hostname": f"endpoint-{i:06d}.example.com",
+            "ip_address": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "status": "up" if i % 7 else "down",
+            "uptime_seconds": i * 37,
+            "interfaces": [{"name": f"eth{n}", "in_octets": i * n, "out_octets": i * n * 3} for n in range(3)],
+        }
+        for i in range(records)
+    ]
+    return json.dumps(endpoints, indent=4).encode("utf-8")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            sample = f.read()
+    else:
+        sample = _sample_json_payload()
+    print(f"benchmarking {len(sample) / (1024 * 1024):.1f} MB sample with codecs: {list(CODECS)}")
+    print(f"{'codec':<6} {'level':>5} {'ratio':>7} {'comp MB/s':>10} {'decomp MB/s':>12}")
+    for result in benchmark_codecs(sample):
+        print(
+            f"{result['codec']:<6} {result['level']:>5} {result['ratio']:>7} "
+            f"{result['compress_mb_s']:>10} {result['decompress_mb_s']:>12}"
+        )
@@ -1,25 +1,74 @@
 """
 # Shared file tools module
 """
+import copy
 import json
-import gzip
 import io
 import time
 import path
 import yaml
 import sys
 import glob, os, shutil
+import sqlite3
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from logging import Logger
 
 # need this before importing from log_tools to prevent relative import issue
 sys.path.append(path.Path(__file__).parent.abspath())
 from log_tools import log_exceptions
+from compression_tools import get_codec, get_codec_for_filename, is_compressed_filename
+from json_tools import json_loads, json_dumps, json_dumps_bytes
+
+
+# use the libyaml C parser when PyYAML was built with it
+try:
+    YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    YamlLoader = yaml.SafeLoader
+
+# process-wide settings cache: absolute filepath -> (mtime_ns, size, settings)
+_settings_cache = {}
+_settings_cache_lock = threading.Lock()
+
+
+@log_exceptions
+def get_yaml_settings(directory, filename, use_cache: bool = True):
+    """
+    Load a yaml settings file
+
+    Parsed settings are cached per file for the life of the process and only re-parsed
+     when the file's mtime (or size) changes, so this is cheap to call repeatedly.
+    Each call returns its own copy, so callers can change it without affecting each other.
+    Use reload_settings() to force a re-read.
+    """
+    filepath = os.path.abspath(f"{directory}/{filename}")
+    stat = os.stat(filepath)
+    if use_cache:
+        cached = _settings_cache.get(filepath)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return copy.deepcopy(cached[2])
+    with open(filepath, "r") as f:
+        settings = yaml.load(f, Loader=YamlLoader)
+    with _settings_cache_lock:
+        _settings_cache[filepath] = (stat.st_mtime_ns, stat.st_size, settings)
+    return copy.deepcopy(settings)
 
 
 @log_exceptions
-def get_yaml_settings(directory, filename):
-    with open(f"{directory}/{filename}", "r") as f:
-        return yaml.safe_load(f)
+def reload_settings(directory=None, filename=None):
+    """
+    Drop cached settings so the next get_yaml_settings() re-reads from disk
+     with directory and filename: drop (and re-read) only that file, returns its settings
+     without arguments: drop every cached file
+    """
+    with _settings_cache_lock:
+        if directory is None and filename is None:
+            _settings_cache.clear()
+            return None
+        _settings_cache.pop(os.path.abspath(f"{directory}/{filename}"), None)
+    return get_yaml_settings(directory, filename)
 
 
 @log_exceptions
@@ -151,29 +200,144 @@ def get_timestamp_for_filename(time_obj: time) -> str:
 
 
 @log_exceptions
-def load_json_file(filename: str) -> dict:
-    with open(filename, "r") as openfile:
-        json_object = json.load(openfile)
+def load_json_file(filename: str, fast: bool = False) -> dict:
+    # fast=True parses with the fastest installed JSON backend, which is lossy on big ints/NaN (see json_tools)
+    with open(filename, "rb") as openfile:
+        json_object = json_loads(openfile.read(), fast=fast)
         openfile.close()
         return json_object
 
 
 @log_exceptions
-def to_json_file(json_data: json, filename: str) -> None:
+def to_json_file(json_data: json, filename: str, compact: bool = False) -> None:
+    """
+    Write json_data (a str is written as-is) to filename
+     compact=False: pretty printed with indent=4
+     compact=True: no whitespace, serialized with the fastest installed JSON backend (see json_tools)
+                   use this for files that are only read by other scripts, written as utf-8
+    """
+    if compact and not type(json_data) is str:
+        with open(filename, "wb") as outfile:
+            outfile.write(json_dumps_bytes(json_data))
+            outfile.close()
+        return
     if not type(json_data) is str:
-        json_data = json.dumps(json_data, indent=4)
+        json_data = json_dumps(json_data)
     with open(filename, "w") as outfile:
         outfile.write(json_data)
         outfile.close()
 
 
+def iter_jsonl_file(filename: str, fast: bool = False):
+    """
+    Generator that yields one record per line of a JSON Lines file
+     reads transparently through compression if filename has a compressed extension
+     e.g., 'endpoints_2023_12_25.jsonl.gz'
+     blank lines are skipped
+     fast=True parses with the fastest installed JSON backend, see load_json_file()
+
+    Only one line is held in memory at a time, e.g.:
+        for record in iter_jsonl_file(filename):
+            process(record)
+    """
+    codec = get_codec_for_filename(filename)
+    if codec:
+        infile = codec.open(filename, "rb")
+    else:
+        infile = open(filename, "rb")
+    with infile:
+        for line in infile:
+            if line.strip():
+                yield json_loads(line, fast=fast)
+
+
+@log_exceptions
+def to_jsonl_file(
+    records,
+    filename: str,
+    batch_size: int = 1000,
+    append: bool = False,
+    codec: str | None = None,
+    level: int | None = None,
+) -> int:
+    """
+    Write an iterable (or generator) of records to a JSON Lines file, one compact record per line
+
+    Args:
+        records (iterable): records to write, consumed one at a time
+        filename (str): file to write, compressed if it has a compressed extension (e.g., '.jsonl.gz')
+        batch_size (int, optional): number of records buffered between writes/flushes. Defaults to 1000.
+        append (bool, optional): append to an existing file instead of overwriting. Defaults to False.
+            Not supported for codecs whose readers stop after the first frame (zstd, lz4)
+        codec (str, optional): compress with this codec, its extension is appended to filename if missing
+        level (int, optional): compression level. Defaults to the codec's default
+
+    Returns:
+        int: number of records written
+
+    Memory use is bounded by batch_size records, regardless of how many records are written
+    """
+    mode = "ab" if append else "wb"
+    if codec is None:
+        compression_codec = get_codec_for_filename(filename)
+    else:
+        compression_codec = get_codec(codec)
+        if not filename.endswith(compression_codec.extension):
+            filename = f"{filename}{compression_codec.extension}"
+    if append and compression_codec and not compression_codec.supports_concatenation:
+        # an appended frame would be silently dropped by iter_jsonl_file()
+        raise Exception(f"Cannot append to '{filename}', {compression_codec.name} files are read up to their first frame")
+    if compression_codec:
+        outfile = compression_codec.open(filename, mode, level=level)
+    else:
+        outfile = open(filename, mode)
+
+    count = 0
+    batch = []
+    with outfile:
+        for record in records:
+            batch.append(json_dumps_bytes(record))
+            batch.append(b"\n")
+            count += 1
+            if len(batch) >= 2 * batch_size:
+                outfile.write(b"".join(batch))
+                outfile.flush()
+                batch = []
+        if batch:
+            outfile.write(b"".join(batch))
+    return count
+
+
 @log_exceptions
-def to_gzip_file(data_text: str, filename: str) -> None:
-    with gzip.open(filename, "wb") as output:
+def to_gzip_file(
+    data_text: str, filename: str, codec: str | None = None, level: int | None = None
+) -> str:
+    """
+    Write data_text (utf-8) to a compressed file
+
+    Args:
+        data_text (str): text to write
+        filename (str): file to write
+        codec (str, optional): 'gzip', 'bz2', 'xz', 'zstd' or 'lz4' (see compression_tools).
+            Defaults to None (gzip, filename used as-is).
+            When a codec is given, its extension is appended to filename if missing
+        level (int, optional): compression level. Defaults to the codec's default (gzip: 9)
+
+    Returns:
+        str: filename written
+    """
+    if codec is None:
+        compression_codec = get_codec("gzip")
+    else:
+        compression_codec = get_codec(codec)
+        if not filename.endswith(compression_codec.extension):
+            filename = f"{filename}{compression_codec.extension}"
+    with compression_codec.open(filename, "wb", level=level) as output:
         # We cannot directly write Python objects like strings!
         # We must first convert them into a bytes format using io.BytesIO() and then write it
         with io.TextIOWrapper(output, encoding="utf-8") as encode:
             encode.write(data_text)
+    return filename
 
 
 @log_exceptions
@@ -185,33 +349,147 @@ def get_directory_path_from_filepath(filepath):
     return dir_path
 
 
+def _compress_stream_chunked(
+    f_in, f_out, chunk_size: int, max_workers: int = None, codec=None, level: int = None
+) -> None:
+    """
+    pigz-style block-parallel compression:
+     each chunk_size block of f_in is compressed into its own complete gzip member
+     and the members are written to f_out in input order.
+
+    A file of concatenated gzip members is a valid gzip file (RFC 1952), so stock gzip,
+     zcat and python's gzip module all decompress it back to the original bytes.
+     (the same holds for bz2 and xz streams, see CompressionCodec.supports_concatenation)
+    zlib releases the GIL while compressing, so a thread pool uses all cores
+     without having to pickle chunks across processes.
+    At most 2 * max_workers chunks are held in memory at a time.
+    """
+    if codec is None:
+        codec = get_codec("gzip")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_in_flight = 2 * max_workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            chunk = f_in.read(chunk_size)
+            if not chunk:
+                break
+            pending.append(executor.submit(codec.compress, chunk, level))
+            if len(pending) >= max_in_flight:
+                f_out.write(pending.popleft().result())
+        while pending:
+            f_out.write(pending.popleft().result())
+
+
 @log_exceptions
-def gzip_file(filepath, out_dir):
+def gzip_file(
+    filepath,
+    out_dir,
+    chunk_size: int = None,
+    max_workers: int = None,
+    codec: str = "gzip",
+    level: int = None,
+):
+    """
+    Compress (or copy, if already compressed) a file into out_dir
+     files with any compressed extension (.gz .bz2 .xz .zst .lz4 .zip) are copied as-is
+
+    Args:
+        filepath (str): path of the file to compress
+        out_dir (str): directory to write the compressed file to
+        chunk_size (int, optional): compress in parallel blocks of this many bytes
+            (e.g., 16 * 1024 * 1024) instead of streaming through one gzip writer.
+            Only gzip, bz2 and xz support this, zstd and lz4 ignore chunk_size and use a single stream
+            (see CompressionCodec.supports_concatenation). Defaults to None (single stream)
+        max_workers (int, optional): threads used when chunk_size is set.
+            Defaults to None (one per CPU core)
+        codec (str, optional): 'gzip', 'bz2', 'xz', 'zstd' or 'lz4' (see compression_tools).
+            Defaults to 'gzip'. The codec's extension is appended to the filename
+        level (int, optional): compression level. Defaults to the codec's default (gzip: 9)
+
+    Returns:
+        str: destination filepath
+    """
     path_elements = separate_and_strip_path_elements(filepath)
     filename = path_elements[-1]
-    file_extension = get_file_extension(filename)
+    compression_codec = get_codec(codec)
 
-    if file_extension in ["gz", "zip"]:
-        # just copy if already zipped
+    if is_compressed_filename(filename):
+        # just copy if already compressed
         dst_filepath = os.path.join(out_dir, filename)
         shutil.copyfile(filepath, dst_filepath)
     else:
-        # gzip compress file
-        compressed_filename = f"{filename}.gz"
+        # compress file
+        compressed_filename = f"{filename}{compression_codec.extension}"
         dst_filepath = os.path.join(out_dir, compressed_filename)
-        with open(filepath, "rb") as f_in:
-            with gzip.open(dst_filepath, "wb") as f_out:
-                shutil.copyfileobj(f_in, f_out)
+        if chunk_size and compression_codec.supports_concatenation:
+            with open(filepath, "rb") as f_in:
+                with open(dst_filepath, "wb") as f_out:
+                    _compress_stream_chunked(
+                        f_in, f_out, chunk_size, max_workers, compression_codec, level
+                    )
+        else:
+            with open(filepath, "rb") as f_in:
+                with compression_codec.open(dst_filepath, "wb", level=level) as f_out:
+                    shutil.copyfileobj(f_in, f_out)
 
     return dst_filepath
 
 
 @log_exceptions
-def gzip_files(source_filepaths, out_dir):
+def gzip_files(
+    source_filepaths,
+    out_dir,
+    max_workers: int = 1,
+    use_logger: Logger = None,
+    codec: str = "gzip",
+    level: int = None,
+):
+    """
+    Compress (or copy, if already compressed) each source file into out_dir
+
+    Args:
+        source_filepaths (list): paths of the files to compress
+        out_dir (str): directory to write the compressed files to
+        max_workers (int, optional): number of worker processes to compress with.
+            Defaults to 1 (compress one at a time in this process).
+            Use None for one worker per CPU core.
+        use_logger (Logger, optional): logging.Logger to report per-file failures
+        codec (str, optional): compression codec, see gzip_file(). Defaults to 'gzip'
+        level (int, optional): compression level. Defaults to the codec's default
+
+    Returns:
+        list: destination filepaths, in the same order as source_filepaths
+
+    Description:
+        With max_workers == 1 the first failure raises (the original behavior).
+
+        With max_workers > 1 (or None) files are compressed across a process pool.
+        A failure does not abort the batch, instead the exception is returned in
+        that file's position of the result list (like asyncio.gather(return_exceptions=True))
+    """
+    if max_workers == 1:
+        compressed_source_filepaths = []
+        for src_filepath in source_filepaths:
+            dst_filepath = gzip_file(src_filepath, out_dir, codec=codec, level=level)
+            compressed_source_filepaths.append(dst_filepath)
+        return compressed_source_filepaths
+
     compressed_source_filepaths = []
-    for src_filepath in source_filepaths:
-        dst_filepath = gzip_file(src_filepath, out_dir)
-        compressed_source_filepaths.append(dst_filepath)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(gzip_file, src_filepath, out_dir, codec=codec, level=level)
+            for src_filepath in source_filepaths
+        ]
+        for src_filepath, future in zip(source_filepaths, futures):
+            try:
+                dst_filepath = future.result()
+            except Exception as e:
+                if use_logger:
+                    use_logger.warning(f"gzip_files failed to compress '{src_filepath}': {e}")
+                dst_filepath = e
+            compressed_source_filepaths.append(dst_filepath)
     return compressed_source_filepaths
 
 
@@ -251,6 +529,8 @@ def get_file_prefix(filename: str, prefix_delimiter: str, use_logger: Logger = N
 def get_file_extension(filename: str):
     """
     Returns a file's extension (if present) or ''
+     for compressed files this is the compression extension, e.g., 'file.json.zst' -> '.zst'
+     (see compression_tools.is_compressed_filename())
 
     Args:
         filename (str): file name
@@ -266,12 +546,18 @@ def get_file_extension(filename: str):
 
 
 @log_exceptions
-def get_newest_file_of_type_in_folder(folder_path, filename):
+def get_newest_file_of_type_in_folder(folder_path, filename, catalog=None):
+    """
+    Returns the newest file in folder_path with the same prefix and extension as filename
+     (optional) catalog: a FileCatalog to answer from its index instead of globbing the folder
+    """
     print(f"looking for {filename} in {folder_path}")
     shared_settings = get_shared_settings()
     prefix_delimiter = shared_settings["prefix_delimiter"]
     prefix = get_file_prefix(filename, prefix_delimiter)
     extension = get_file_extension(filename)
+    if catalog is not None:
+        return catalog.newest_file(folder_path, prefix, extension, prefix_glob=True)
     file_list = sorted(
         glob.glob(os.path.join(folder_path, f"{prefix}*{extension}")),
         key=os.path.getmtime,
@@ -280,32 +566,311 @@ def get_newest_file_of_type_in_folder(folder_path, filename):
     return file_list[0]
 
 
+# one file seen by FileIndex, mtime is st_mtime (float seconds)
+FileEntry = namedtuple("FileEntry", ["name", "path", "prefix", "extension", "size", "mtime"])
+
+
+class FileIndex:
+    """
+    Index of the files in a folder, grouped by file type (prefix, extension)
+
+    The folder is read with a single os.scandir() pass, each file is stat'ed once
+     (via DirEntry.stat()) and the newest file of each type is tracked as we go.
+    Hidden files (starting with '.') and directories are skipped.
+
+    Example usage:
+        file_index = FileIndex("./output")
+        file_index.newest_files()  # newest file of each type
+        file_index.newest_file("file_name", ".json")
+        file_index.files_of_type("file_name", ".json")  # newest first
+        file_index.files_of_type_like("file_name_2023_12_25.json")
+    """
+
+    def __init__(self, folder_path: str, prefix_delimiter: str | None = None) -> None:
+        if prefix_delimiter is None:
+            prefix_delimiter = get_shared_settings()["prefix_delimiter"]
+        self.folder_path = folder_path
+        self.prefix_delimiter = prefix_delimiter
+        self.groups = {}  # (prefix, extension) -> [FileEntry, ...]
+        self.newest = {}  # (prefix, extension) -> FileEntry
+        self.scan()
+
+    def file_type(self, filename: str) -> tuple:
+        """
+        Returns the (prefix, extension) key of a filename, e.g., 'file_name_2023_12_25.json' -> ('file_name', '.json')
+        """
+        return (
+            get_file_prefix(filename, self.prefix_delimiter),
+            get_file_extension(filename),
+        )
+
+    def scan(self) -> None:
+        """
+        (re)read the folder
+        """
+        self.groups = {}
+        self.newest = {}
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                prefix, extension = self.file_type(entry.name)
+                file_entry = FileEntry(
+                    entry.name, entry.path, prefix, extension, stat.st_size, stat.st_mtime
+                )
+                key = (prefix, extension)
+                self.groups.setdefault(key, []).append(file_entry)
+                newest = self.newest.get(key)
+                if newest is None or file_entry.mtime > newest.mtime:
+                    self.newest[key] = file_entry
+
+    def file_types(self) -> list:
+        return list(self.groups)
+
+    def newest_file(self, prefix: str, extension: str) -> str | None:
+        """
+        Returns the path of the newest file of this type, or None if there are none
+        """
+        newest = self.newest.get((prefix, extension))
+        return newest.path if newest else None
+
+    def newest_files(self) -> list:
+        """
+        Returns the path of the newest file of each type
+        """
+        return [file_entry.path for file_entry in self.newest.values()]
+
+    def files_of_type(self, prefix: str, extension: str, newest_first: bool = True, prefix_glob: bool = False) -> list:
+        """
+        Returns the FileEntry's of this type sorted by mtime (newest first by default)
+         prefix_glob=True: files matching glob('{prefix}*{extension}') instead of exactly this type
+        """
+        if prefix_glob:
+            file_entries = [
+                file_entry
+                for (_, group_extension), group in self.groups.items()
+                if (not extension or group_extension == extension)
+                for file_entry in group
+                if file_entry.name.startswith(prefix)
+            ]
+        else:
+            file_entries = self.groups.get((prefix, extension), [])
+        return sorted(
+            file_entries,
+            key=lambda file_entry: file_entry.mtime,
+            reverse=newest_first,
+        )
+
+    def files_of_type_like(self, filename: str, newest_first: bool = True) -> list:
+        """
+        Same as files_of_type() using a filename as template, e.g., 'file_name_2023_12_25.json'
+        """
+        prefix, extension = self.file_type(filename)
+        return self.files_of_type(prefix, extension, newest_first=newest_first)
+
+
+class FileCatalog:
+    """
+    Persistent (sqlite) catalog of the files in watched folders:
+     name, prefix, extension, size and mtime of every (non-hidden) file
+
+    A folder is only rescanned when its own mtime changed since the last scan
+     (creating, deleting or renaming a file changes it), otherwise queries are
+     answered from the catalog's (folder, prefix, extension, mtime) index.
+    Rewriting an existing file in place does not change the folder's mtime,
+     use refresh(folder_path, force=True) if you need to pick that up.
+
+    The catalog can be stored in a watched folder, give it a hidden name (e.g., '.file_catalog.sqlite')
+     so it isn't catalogued itself. Its journal is kept (journal_mode=PERSIST) instead of being created
+     and deleted on every write, which would change the folder's mtime and force a rescan each time.
+
+    Example usage:
+        catalog = FileCatalog("./file_catalog.sqlite")
+        catalog.newest_file("./output", "file_name", ".json")
+        catalog.newest_files("./output")
+        catalog.files_beyond_limit("./output", "file_name", ".json", keep=7)
+
+        # or pass it to the file_tools helpers:
+        get_newest_file_of_type_in_folder("./output", "file_name_2023_12_25.json", catalog=catalog)
+        cleanup_files("./output", "file_name_2023_12_25.json", 7, catalog=catalog)
+    """
+
+    def __init__(self, db_path: str, prefix_delimiter: str | None = None) -> None:
+        if prefix_delimiter is None:
+            prefix_delimiter = get_shared_settings()["prefix_delimiter"]
+        self.db_path = db_path
+        self.prefix_delimiter = prefix_delimiter
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        # keep the journal file between writes, see above
+        self.connection.execute("PRAGMA journal_mode=PERSIST")
+        with self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS folders (
+                    folder TEXT PRIMARY KEY,
+                    prefix_delimiter TEXT,
+                    dir_mtime_ns INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    folder TEXT,
+                    name TEXT,
+                    prefix TEXT,
+                    extension TEXT,
+                    size INTEGER,
+                    mtime REAL,
+                    PRIMARY KEY (folder, name)
+                );
+                CREATE INDEX IF NOT EXISTS files_by_type
+                    ON files (folder, prefix, extension, mtime);
+                """
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def refresh(self, folder_path: str, force: bool = False) -> bool:
+        """
+        Bring the catalog of folder_path up to date, returns True if the folder was rescanned
+         only changed rows are written
+        """
+        folder = os.path.abspath(folder_path)
+        dir_mtime_ns = os.stat(folder).st_mtime_ns
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT prefix_delimiter, dir_mtime_ns FROM folders WHERE folder = ?", (folder,)
+            ).fetchone()
+            if not force and row == (self.prefix_delimiter, dir_mtime_ns):
+                return False
+
+            file_index = FileIndex(folder, self.prefix_delimiter)
+            scanned = {}
+            for file_entries in file_index.groups.values():
+                for file_entry in file_entries:
+                    scanned[file_entry.name] = file_entry
+            known = {
+                name: (prefix, extension, size, mtime)
+                for name, prefix, extension, size, mtime in self.connection.execute(
+                    "SELECT name, prefix, extension, size, mtime FROM files WHERE folder = ?", (folder,)
+                )
+            }
+            changed = [
+                (folder, f.name, f.prefix, f.extension, f.size, f.mtime)
+                for f in scanned.values()
+                if known.get(f.name) != (f.prefix, f.extension, f.size, f.mtime)
+            ]
+            removed = [(folder, name) for name in known if name not in scanned]
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", changed)
+                self.connection.executemany("DELETE FROM files WHERE folder = ? AND name = ?", removed)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                    (folder, self.prefix_delimiter, dir_mtime_ns),
+                )
+        return True
+
+    def remove(self, folder_path: str, names: list) -> None:
+        """
+        Drop files from the catalog (e.g., after deleting them)
+        """
+        folder = os.path.abspath(folder_path)
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM files WHERE folder = ? AND name = ?", [(folder, name) for name in names]
+            )
+
+    def _file_entries(self, folder: str, rows) -> list:
+        return [
+            FileEntry(name, os.path.join(folder, name), prefix, extension, size, mtime)
+            for name, prefix, extension, size, mtime in rows
+        ]
+
+    def _type_filter(self, folder: str, prefix: str, extension: str, prefix_glob: bool) -> tuple:
+        # prefix_glob=True: same files as glob('{prefix}*{extension}'), e.g., 'file_name' also matches
+        #  'file_name_detail_2023_12_25.json', instead of exactly this prefix
+        if not prefix_glob:
+            return "folder = ? AND prefix = ? AND extension = ?", [folder, prefix, extension]
+        # a range on the (folder, name) primary key, so only the names with this prefix are read
+        where, params = "folder = ? AND name >= ?", [folder, prefix]
+        if prefix and prefix[-1] < chr(sys.maxunicode):
+            where, params = f"{where} AND name < ?", params + [prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if extension:
+            where, params = f"{where} AND extension = ?", params + [extension]
+        return where, params
+
+    def files_of_type(
+        self, folder_path: str, prefix: str, extension: str, offset: int = 0, prefix_glob: bool = False
+    ) -> list:
+        """
+        Returns the FileEntry's of this type, newest first, skipping the newest 'offset' files
+         prefix_glob=True: files matching glob('{prefix}*{extension}') instead of exactly this type
+        """
+        folder = os.path.abspath(folder_path)
+        self.refresh(folder)
+        where, params = self._type_filter(folder, prefix, extension, prefix_glob)
+        with self._lock:
+            rows = self.connection.execute(
+                f"""
+                SELECT name, prefix, extension, size, mtime FROM files
+                WHERE {where}
+                ORDER BY mtime DESC LIMIT -1 OFFSET ?
+                """,
+                (*params, offset),
+            ).fetchall()
+        return self._file_entries(folder, rows)
+
+    def files_beyond_limit(
+        self, folder_path: str, prefix: str, extension: str, keep: int, prefix_glob: bool = False
+    ) -> list:
+        """
+        Returns the FileEntry's of this type that are not among the 'keep' newest (newest first)
+        """
+        return self.files_of_type(folder_path, prefix, extension, offset=keep, prefix_glob=prefix_glob)
+
+    def newest_file(self, folder_path: str, prefix: str, extension: str, prefix_glob: bool = False) -> str | None:
+        """
+        Returns the path of the newest file of this type, or None if there are none
+        """
+        folder = os.path.abspath(folder_path)
+        self.refresh(folder)
+        where, params = self._type_filter(folder, prefix, extension, prefix_glob)
+        with self._lock:
+            row = self.connection.execute(
+                f"""
+                SELECT name FROM files
+                WHERE {where}
+                ORDER BY mtime DESC LIMIT 1
+                """,
+                params,
+            ).fetchone()
+        return os.path.join(folder, row[0]) if row else None
+
+    def newest_files(self, folder_path: str) -> list:
+        """
+        Returns the path of the newest file of each type (prefix, extension)
+        """
+        folder = os.path.abspath(folder_path)
+        self.refresh(folder)
+        with self._lock:
+            # sqlite returns the row holding MAX(mtime) for the bare 'name' column
+            rows = self.connection.execute(
+                "SELECT name, MAX(mtime) FROM files WHERE folder = ? GROUP BY prefix, extension",
+                (folder,),
+            ).fetchall()
+        return [os.path.join(folder, name) for name, _ in rows]
+
+
 @log_exceptions
-def get_newest_file_of_each_type_in_folder(folder_path):
-    out_file_list = []
-    file_types = {}
-    shared_settings = get_shared_settings()
-    prefix_delimiter = shared_settings["prefix_delimiter"]
-    candidate_files = os.listdir(folder_path)
-    for candidate_file in candidate_files:
-        filepath = os.path.join(folder_path, candidate_file)
-        if os.path.isfile(filepath):
-            if candidate_file[0] not in [
-                ".",
-            ]:
-                prefix = get_file_prefix(candidate_file, prefix_delimiter)
-                extension = get_file_extension(candidate_file)
-                file_type_key = f"{prefix}_{extension}"
-                file_type = {
-                    "prefix": prefix,
-                    "extension": extension,
-                }
-                file_types[file_type_key] = file_type
-    for file_type_key, file_type in file_types.items():
-        filename = f"{file_type['prefix']}{prefix_delimiter}{file_type['extension']}"
-        out_file = get_newest_file_of_type_in_folder(folder_path, filename)
-        out_file_list.append(out_file)
-    return out_file_list
+def get_newest_file_of_each_type_in_folder(folder_path, catalog: FileCatalog = None):
+    """
+    Returns the path of the newest file of each type (prefix, extension) in folder_path
+     see FileIndex, this is a single directory scan
+     (optional) catalog: a FileCatalog to answer from its index instead of scanning the folder
+    """
+    if catalog is not None:
+        return catalog.newest_files(folder_path)
+    return FileIndex(folder_path).newest_files()
 
 
 @log_exceptions
@@ -314,6 +879,7 @@ def cleanup_files(
     filename: str,
     cleanup_limit: int,
     use_logger: Logger = None,
+    catalog: FileCatalog = None,
 ):
     """
     Cleanup local files based on age
@@ -323,6 +889,8 @@ def cleanup_files(
         filename (str): file name template to cleanup (see below)
         cleanup_limit (int): number of (newest) files to keep
         use_logger (Logger, optional): logging.Logger to print item deletions, errors, etc.
+        catalog (FileCatalog, optional): find the files to delete with an indexed lookup
+            in this catalog instead of globbing (same files, hidden files excepted)
 
     Description:
         This uses the filename as a template for gathering other files with the
@@ -341,6 +909,15 @@ def cleanup_files(
     prefix_delimiter = shared_settings["prefix_delimiter"]
     prefix = get_file_prefix(filename, prefix_delimiter, use_logger=use_logger)
     extension = get_file_extension(filename)
+    if catalog is not None:
+        file_entries = catalog.files_beyond_limit(cleanup_dir, prefix, extension, cleanup_limit, prefix_glob=True)
+        for file_entry in file_entries:
+            if use_logger:
+                use_logger.info(f"cleanup deleting up file {file_entry.path}")
+            os.remove(file_entry.path)
+        catalog.remove(cleanup_dir, [file_entry.name for file_entry in file_entries])
+        return
+
     # Get the list of all files in the directory with same extension
     #  that start with this prefix (newest first)
     file_list = sorted(
@@ -360,5 +937,142 @@ def cleanup_files(
             os.remove(file)
 
 
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+@log_exceptions
+def plan_retention(policies: list, now: float | None = None, use_logger: Logger = None) -> list:
+    """
+    Work out which files a retention policy table would delete, without deleting anything
+
+    Args:
+        policies (list): policy dicts, see apply_retention()
+        now (float, optional): time.time() to measure max_age_days against. Defaults to now.
+        use_logger (Logger, optional): logging.Logger for prefix and missing directory warnings
+
+    Returns:
+        list: FileEntry's to delete (each file at most once)
+
+    Every directory is scanned once (see FileIndex), however many policies refer to it
+     directories that don't exist are skipped
+    """
+    if now is None:
+        now = time.time()
+    prefix_delimiter = get_shared_settings()["prefix_delimiter"]
+
+    # directory -> [(prefix, extension, policy), ...]
+    rules_by_directory = {}
+    for policy in policies:
+        directories = _as_list(policy.get("directory")) + _as_list(policy.get("directories"))
+        filenames = _as_list(policy.get("filename")) + _as_list(policy.get("filenames"))
+        for directory in directories:
+            for filename in filenames:
+                prefix = get_file_prefix(filename, prefix_delimiter, use_logger=use_logger)
+                extension = get_file_extension(filename)
+                rules_by_directory.setdefault(directory, []).append((prefix, extension, policy))
+
+    to_delete = {}
+    for directory, rules in rules_by_directory.items():
+        try:
+            file_index = FileIndex(directory, prefix_delimiter)
+        except FileNotFoundError:
+            # nothing to clean up, as with cleanup_files()
+            if use_logger:
+                use_logger.warning(f"retention skipping missing directory {directory}")
+            continue
+        for prefix, extension, policy in rules:
+            keep = policy.get("keep")
+            max_age_days = policy.get("max_age_days")
+            max_total_bytes = policy.get("max_total_bytes")
+            total_bytes = 0
+            prefix_glob = policy.get("prefix_glob", True)
+            file_entries = file_index.files_of_type(prefix, extension, prefix_glob=prefix_glob)
+            for i, file_entry in enumerate(file_entries):
+                total_bytes += file_entry.size
+                if (
+                    (keep is not None and i >= keep)
+                    or (max_age_days is not None and now - file_entry.mtime > max_age_days * 86400)
+                    or (max_total_bytes is not None and total_bytes > max_total_bytes)
+                ):
+                    to_delete[file_entry.path] = file_entry
+    return list(to_delete.values())
+
+
+@log_exceptions
+def apply_retention(
+    policies: list,
+    dry_run: bool = False,
+    max_workers: int = 8,
+    use_logger: Logger = None,
+) -> dict:
+    """
+    Batch retention: plan every deletion for a table of policies from one scan per directory,
+     then delete concurrently
+
+    Args:
+        policies (list): policy dicts, each with:
+            'directory' (str) and/or 'directories' (list): where to look
+            'filename' (str) and/or 'filenames' (list): file name templates, as for cleanup_files()
+                e.g., 'file_name_2023_12_25.json' -> glob('file_name*.json') in each directory
+                (hidden files are never matched)
+            'prefix_glob' (bool, optional): False to only match files of exactly this type,
+                e.g., 'file_name_2023_12_25.json' but not 'file_name_detail_2023_12_25.json'. Defaults to True.
+            and any of these limits (files breaking any limit are deleted, oldest files go first):
+            'keep' (int): number of newest files to keep
+            'max_age_days' (float): delete files older than this
+            'max_total_bytes' (int): keep the newest files that fit in this many bytes
+        dry_run (bool, optional): only report what would be deleted. Defaults to False.
+        max_workers (int, optional): threads used to delete files. Defaults to 8.
+        use_logger (Logger, optional): logging.Logger to print item deletions, errors, etc.
+
+    Returns:
+        dict: {'dry_run', 'files_deleted', 'bytes_reclaimed', 'deleted': [paths], 'errors': {path: error}}
+
+    Example (this table could also live in a settings yml):
+        apply_retention([
+            {"directories": ["./output", "./archive"], "filenames": ["report_2023_12_25.json"], "keep": 7},
+            {"directory": "./logs", "filename": "job_2023_12_25.log", "max_age_days": 30, "max_total_bytes": 10**9},
+        ])
+    """
+    planned = plan_retention(policies, use_logger=use_logger)
+    summary = {
+        "dry_run": dry_run,
+        "files_deleted": 0,
+        "bytes_reclaimed": 0,
+        "deleted": [],
+        "errors": {},
+    }
+    if dry_run:
+        for file_entry in planned:
+            if use_logger:
+                use_logger.info(f"retention (dry run) would delete file {file_entry.path}")
+            summary["files_deleted"] += 1
+            summary["bytes_reclaimed"] += file_entry.size
+            summary["deleted"].append(file_entry.path)
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(file_entry, executor.submit(os.remove, file_entry.path)) for file_entry in planned]
+        for file_entry, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                if use_logger:
+                    use_logger.warning(f"retention failed to delete file {file_entry.path}: {e}")
+                summary["errors"][file_entry.path] = str(e)
+                continue
+            if use_logger:
+                use_logger.info(f"retention deleting file {file_entry.path}")
+            summary["files_deleted"] += 1
+            summary["bytes_reclaimed"] += file_entry.size
+            summary["deleted"].append(file_entry.path)
+    return summary
+
+
 if __name__ == "__main__":
     print("Example tools (you are running this as a script instead of importing)")
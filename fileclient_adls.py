@@ -31,11 +31,302 @@ from azure.storage.filedatalake import (
     DataLakeServiceClient,
     DataLakeDirectoryClient,
     FileSystemClient,
+    ContentSettings,
 )
-from azure.core.paging import ItemPaged
-from azure.core.exceptions import ResourceModifiedError
+from azure.core.exceptions import (
+    HttpResponseError,
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+    ServiceRequestError,
+    ServiceResponseError,
+)
+from azure.core.pipeline.transport import RequestsTransport
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 import sys, os
 import time
+import random
+import threading
+from collections import deque, namedtuple
+from logging import Logger
+from typing import Iterable, Iterator, Protocol, runtime_checkable
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+# lightweight record of one listed path, see AdlsConnection.iter_directory_contents()
+AdlsPathRecord = namedtuple(
+    "AdlsPathRecord", ["name", "is_directory", "content_length", "last_modified", "etag"]
+)
+
+
+class DirectoryListing:
+    """
+    Returned by AdlsConnection.list_directory_contents(), iterable any number of times (like ItemPaged)
+     each iteration lists the directory (or uses the listing cache), see iter_directory_contents()
+    """
+
+    def __init__(self, connection, directory_path: str, recursive: bool, use_cache: bool) -> None:
+        self.connection = connection
+        self.directory_path = directory_path
+        self.recursive = recursive
+        self.use_cache = use_cache
+
+    def __iter__(self) -> Iterator[AdlsPathRecord]:
+        return self.connection.iter_directory_contents(
+            self.directory_path, recursive=self.recursive, use_cache=self.use_cache
+        )
+
+
+def compute_file_hash(filepath: str, algorithm: str = "md5", chunk_size: int = 4 * 1024 * 1024) -> bytes:
+    """
+    Hash a file without reading it into memory at once, returns the digest bytes
+     algorithm is 'md5' (what ADLS stores as content_md5) or 'xxh64' (faster, needs: pip install xxhash)
+    """
+    if algorithm == "xxh64":
+        if xxhash is None:
+            raise Exception("Hash algorithm 'xxh64' needs the xxhash module: pip install xxhash")
+        file_hash = xxhash.xxh64()
+    else:
+        file_hash = hashlib.new(algorithm)
+    with open(filepath, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+    return file_hash.digest()
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    True for errors worth retrying: network failures, timeouts, throttling (429) and server errors (5xx)
+    """
+    if isinstance(error, (ServiceRequestError, ServiceResponseError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        return error.status_code == 429 or (error.status_code or 0) >= 500
+    return False
+
+
+# process-wide pools shared by every AdlsConnection, see get_adls_connection()
+_shared_lock = threading.Lock()
+_shared_credentials = {}  # (tenant_id, client_id, secret hash) -> ClientSecretCredential
+_shared_sessions = {}  # (account_url, connection_pool_size) -> requests.Session
+_shared_connections = {}  # (tenant_id, client_id, account_url, file_system_name) -> AdlsConnection
+
+
+def _get_shared_credential(tenant_id: str, client_id: str, client_secret: str) -> ClientSecretCredential:
+    """
+    One credential per service principal, so its cached access token is reused by every connection
+    """
+    secret_hash = hashlib.sha256(client_secret.encode("utf-8")).hexdigest()
+    key = (tenant_id, client_id, secret_hash)
+    with _shared_lock:
+        if key not in _shared_credentials:
+            _shared_credentials[key] = ClientSecretCredential(tenant_id, client_id, client_secret)
+        return _shared_credentials[key]
+
+
+class _BlockSizeHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections read and write the socket in 32 KiB blocks (urllib3 defaults to 8 KiB),
+     like azure's own BiggerBlockSizeHTTPAdapter, which RequestsTransport only mounts when it makes the session
+    """
+
+    blocksize = 32768
+
+    def init_poolmanager(self, *args, **pool_kwargs) -> None:
+        pool_kwargs.setdefault("blocksize", self.blocksize)
+        super().init_poolmanager(*args, **pool_kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs.setdefault("blocksize", self.blocksize)
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+def _get_shared_session(account_url: str, connection_pool_size: int) -> requests.Session:
+    """
+    One HTTP session (keep-alive connection pool) per storage account
+    """
+    key = (account_url, connection_pool_size)
+    with _shared_lock:
+        if key not in _shared_sessions:
+            session = requests.Session()
+            # proxy settings from the environment, as RequestsTransport(use_env_settings=True) sets up its own sessions
+            session.trust_env = True
+            # retries are done by the azure pipeline, not by requests (same as azure's default adapter),
+            #  the pool is sized for the connection's worker threads
+            adapter = _BlockSizeHTTPAdapter(
+                pool_connections=connection_pool_size,
+                pool_maxsize=connection_pool_size,
+                max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _shared_sessions[key] = session
+        return _shared_sessions[key]
+
+
+def get_adls_connection(
+    tenant_id: str,
+    client_id: str,
+    client_secret: str,
+    account_url: str,
+    file_system_name: str,
+    **kwargs,
+) -> "AdlsConnection":
+    """
+    Returns the AdlsConnection for (tenant_id, client_id, account_url, file_system_name),
+     creating it on first use (kwargs are passed to AdlsConnection() then)
+    Use this instead of AdlsConnection(...) when a script needs the same connection in several places,
+     so token acquisition, TLS setup and the directory/listing caches are shared
+    """
+    key = (tenant_id, client_id, account_url, file_system_name)
+    with _shared_lock:
+        connection = _shared_connections.get(key)
+    if connection is None:
+        connection = AdlsConnection(
+            tenant_id, client_id, client_secret, account_url, file_system_name, **kwargs
+        )
+        with _shared_lock:
+            connection = _shared_connections.setdefault(key, connection)
+    return connection
+
+
+def clear_adls_connections() -> None:
+    """
+    Forget every shared connection, credential and HTTP session
+    """
+    with _shared_lock:
+        _shared_connections.clear()
+        _shared_credentials.clear()
+        for session in _shared_sessions.values():
+            session.close()
+        _shared_sessions.clear()
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """
+    The public interface of AdlsConnection, so pipeline code can be written against either backend:
+     AdlsConnection (Azure Data Lake) or fileclient_local.LocalStorageConnection (local disk, optional simulated network)
+
+    'directory_client' arguments are whatever the backend's create_directory()/get_directory() return
+    """
+
+    file_system_name: str
+
+    def get_directory(self, directory_path: str): ...
+
+    def rename_directory(self, directory_client, new_dir_name: str) -> None: ...
+
+    def delete_directory(self, directory_client) -> None: ...
+
+    def create_directory(self, directory_path: str): ...
+
+    def create_daily_folders(self, basepath: str, leaf_only: bool = False): ...
+
+    def download_file_from_directory(
+        self,
+        directory_client,
+        local_path: str,
+        local_file_name: str,
+        adls_file_name: str,
+        max_concurrency: int = 1,
+        decompress: bool = False,
+    ) -> None: ...
+
+    def download_directory(
+        self,
+        directory_path: str,
+        local_path: str,
+        max_workers: int = 8,
+        max_concurrency: int = 1,
+        skip_unchanged: bool = True,
+    ) -> list: ...
+
+    def upload_file_to_directory(
+        self,
+        directory_client,
+        local_path: str,
+        file_name: str,
+        adls_filename: str | None = None,
+        overwrite=True,
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> bool: ...
+
+    def upload_large_file_to_directory(
+        self,
+        directory_client,
+        local_path: str,
+        file_name: str,
+        adls_filename: str | None = None,
+        chunk_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        chunks_per_flush: int = 8,
+        progress_callback=None,
+        resume: bool = False,
+    ) -> int: ...
+
+    def upload_files(
+        self,
+        directory_client,
+        local_path: str,
+        file_names: list,
+        adls_filenames: list | None = None,
+        overwrite=True,
+        max_workers: int = 8,
+        retries: int = 3,
+        backoff_seconds: float = 1.0,
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> list: ...
+
+    def upload_directory(
+        self,
+        directory_client,
+        local_path: str,
+        recursive: bool = False,
+        overwrite=True,
+        max_workers: int = 8,
+        retries: int = 3,
+        backoff_seconds: float = 1.0,
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> list: ...
+
+    def upload_data_to_directory(self, directory_client, adls_file_name: str, data: str | bytes, overwrite=True) -> None: ...
+
+    def upload_data_items(
+        self,
+        directory_client,
+        items,
+        overwrite=True,
+        max_workers: int = 8,
+        retries: int = 3,
+        backoff_seconds: float = 1.0,
+    ) -> list: ...
+
+    def invalidate_listing_cache(self, path: str | None = None) -> None: ...
+
+    def iter_directory_contents(self, directory, recursive: bool = False, use_cache: bool = True) -> Iterator[AdlsPathRecord]: ...
+
+    def print_directory_contents(self, directory, recursive: bool = False, print_tree=True, print_list=False) -> None: ...
+
+    def list_directory_contents(
+        self, directory, recursive: bool = False, print_tree=True, print_list=False, use_cache: bool = True
+    ) -> Iterable[AdlsPathRecord]: ...
 
 
 class AdlsConnection:
@@ -49,11 +340,27 @@ class AdlsConnection:
         account_url: str,
         file_system_name: str,
         disable_http_logging: bool = True,
+        download_chunk_size: int = 4 * 1024 * 1024,
+        listing_cache_ttl: float = 30.0,
+        listing_cache_max_entries: int = 100_000,
+        connection_pool_size: int = 10,
+        use_logger: Logger = None,
     ) -> None:
         """
         Setup connection and authenticate to ADLS
         account_url should look like: 'https://adt-calfit-adls@adtedfdatalake.dfs.core.windows.net/'
         file_system_name should look like: 'adt-calfit-adls'
+        download_chunk_size is the size of each ranged GET when downloading,
+         peak memory of a download is about download_chunk_size * max_concurrency
+        listing_cache_ttl is how many seconds directory listings are cached (0 disables the cache),
+         listings are also invalidated by uploads/creates/deletes/renames made through this connection
+        listing_cache_max_entries: listings with more entries than this are streamed but not cached
+        connection_pool_size is the number of keep-alive sockets kept per storage account,
+         set it to at least the number of concurrent uploads/downloads you run
+        use_logger (optional) logging.Logger for per-request diagnostics (logged at debug level)
+
+        Credentials and HTTP sessions are shared with other AdlsConnection's of the same
+         service principal / storage account. To share the whole connection use get_adls_connection()
         """
         if disable_http_logging:
             import logging
@@ -63,9 +370,17 @@ class AdlsConnection:
             )
             azure_http_logger.setLevel(logging.WARNING)  # this was too talky
 
-        credential = ClientSecretCredential(tenant_id, client_id, client_secret)
+        self._init_connection_state(
+            download_chunk_size, listing_cache_ttl, listing_cache_max_entries, use_logger
+        )
+        credential = _get_shared_credential(tenant_id, client_id, client_secret)
+        session = _get_shared_session(account_url, connection_pool_size)
         self.service_client = DataLakeServiceClient(
-            account_url=account_url, credential=credential
+            account_url=account_url,
+            credential=credential,
+            max_single_get_size=download_chunk_size,
+            max_chunk_get_size=download_chunk_size,
+            transport=RequestsTransport(session=session, session_owner=False),
         )
         self.file_system_name = file_system_name
         if self.service_client:
@@ -73,6 +388,25 @@ class AdlsConnection:
                 file_system=file_system_name
             )
 
+    def _init_connection_state(
+        self,
+        download_chunk_size: int,
+        listing_cache_ttl: float,
+        listing_cache_max_entries: int,
+        use_logger: Logger,
+    ) -> None:
+        # settings and caches that don't depend on how we reach the file system
+        self.logger = use_logger
+        self.download_chunk_size = download_chunk_size
+        self.listing_cache_ttl = listing_cache_ttl
+        self.listing_cache_max_entries = listing_cache_max_entries
+        # (directory_path, recursive) -> (expires_at, [AdlsPathRecord, ...])
+        self._listing_cache = {}
+        self._listing_cache_generation = 0
+        self._listing_cache_lock = threading.Lock()
+        # directory paths this connection has created (or seen created), see create_directory()
+        self._known_directories = set()
+
     def get_file_system_client(self, file_system_name: str) -> None:
         """
         Setup connection to ADLS filesystem
@@ -98,9 +432,28 @@ class AdlsConnection:
         directory_client.rename_directory(
             new_name=f"{directory_client.file_system_name}/{new_dir_name}"
         )
+        self.invalidate_listing_cache(directory_client.path_name)
+        self.invalidate_listing_cache(new_dir_name)
+        self.forget_known_directories(directory_client.path_name)
 
     def delete_directory(self, directory_client: DataLakeDirectoryClient) -> None:
         directory_client.delete_directory()
+        self.invalidate_listing_cache(directory_client.path_name)
+        self.forget_known_directories(directory_client.path_name)
+
+    def forget_known_directories(self, directory_path: str | None = None) -> None:
+        """
+        Drop directories from the create_directory() cache
+         directory_path: drop this directory and its subdirectories
+         no directory_path: drop every known directory
+        """
+        if directory_path is None:
+            self._known_directories.clear()
+            return
+        directory_path = directory_path.strip("/")
+        for known_directory in list(self._known_directories):
+            if known_directory == directory_path or known_directory.startswith(f"{directory_path}/"):
+                self._known_directories.discard(known_directory)
 
     def create_directory(self, directory_path: str) -> DataLakeDirectoryClient:
         """
@@ -109,15 +462,38 @@ class AdlsConnection:
         2) if directory does not already exist, create the directory
 
         Returns an object to interact with this specific directory in ADLS filesystem
+
+        Directories created through this connection are remembered, so calling this again for the same
+         directory (or one of its parents, which ADLS creates implicitly) does not make a request.
+         Directories deleted/renamed through this connection are forgotten, if they are deleted
+         some other way use forget_known_directories()
         """
+        normalized_path = directory_path.strip("/")
+        if normalized_path in self._known_directories:
+            return self.get_directory(directory_path)
         directory_client = self.file_system_client.create_directory(directory_path)
+        self.invalidate_listing_cache(directory_path)
+        path_elements = normalized_path.split("/")
+        for i in range(1, len(path_elements) + 1):
+            self._known_directories.add("/".join(path_elements[:i]))
         return directory_client
 
-    def create_daily_folders(self, basepath: str) -> DataLakeDirectoryClient:
+    def create_daily_folders(self, basepath: str, leaf_only: bool = False) -> DataLakeDirectoryClient:
+        """
+        Get or create /basepath/year/month/day for today
+
+        leaf_only: make a single create call for the day folder, ADLS creates the missing parents
+         (otherwise basepath, year, month and day are created one at a time, as before)
+        Repeated calls are free after the first, see create_directory()
+        """
         directory_client = None
         year = time.strftime("%Y")
         month = time.strftime("%m")
         day = time.strftime("%d")
+        if leaf_only:
+            new_path = f"/{basepath}/{year}/{month}/{day}"
+            print(f"new_path: {new_path}")
+            return self.create_directory(new_path)
         new_path = ""
         for item in [basepath, year, month, day]:
             new_path = f"{new_path}/{item}"
@@ -131,15 +507,131 @@ class AdlsConnection:
         local_path: str,
         local_file_name: str,
         adls_file_name: str,
+        max_concurrency: int = 1,
+        decompress: bool = False,
     ) -> None:
+        """
+        Downloads an ADLS file to a local file, streaming it in download_chunk_size pieces
+         (see __init__) so the whole file never has to fit in memory
+
+            max_concurrency: number of ranges fetched in parallel
+            decompress: gunzip a .gz file while downloading (local_file_name should then be the uncompressed name)
+        """
         file_client = directory_client.get_file_client(adls_file_name)
+        self._download_to_file(
+            file_client, os.path.join(local_path, local_file_name), max_concurrency, decompress
+        )
 
-        with open(
-            file=os.path.join(local_path, local_file_name), mode="wb"
-        ) as local_file:
-            download = file_client.download_file()
-            local_file.write(download.readall())
+    def _download_to_file(self, file_client, filepath: str, max_concurrency: int = 1, decompress: bool = False) -> int:
+        """
+        Streams a file client's content into filepath, returns the number of bytes written
+        """
+        with open(file=filepath, mode="wb") as local_file:
+            download = file_client.download_file(max_concurrency=max_concurrency)
+            if decompress:
+                for data in self._gunzip_chunks(download.chunks()):
+                    local_file.write(data)
+            else:
+                download.readinto(local_file)
+            size = local_file.tell()
             local_file.close()
+        return size
+
+    def _gunzip_chunks(self, chunks):
+        """
+        Generator that gunzips an iterable of compressed chunks
+         handles multi-member gzip files (e.g., from file_tools.gzip_file(chunk_size=...))
+         each yielded piece is at most download_chunk_size bytes
+         raises EOFError if the data ends in the middle of a member (truncated/corrupt file)
+        """
+        decompressor = zlib.decompressobj(wbits=31)
+        member_started = False
+        for chunk in chunks:
+            data = chunk
+            while data:
+                member_started = True
+                yield decompressor.decompress(data, self.download_chunk_size)
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=31)
+                    member_started = False
+                else:
+                    data = decompressor.unconsumed_tail
+        yield decompressor.flush()
+        if member_started and not decompressor.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+    def download_directory(
+        self,
+        directory_path: str,
+        local_path: str,
+        max_workers: int = 8,
+        max_concurrency: int = 1,
+        skip_unchanged: bool = True,
+    ) -> list:
+        """
+        Mirrors an ADLS directory tree (recursively) into local_path
+
+            max_workers: number of files downloaded concurrently
+            max_concurrency: parallel range fetches within each file
+            skip_unchanged: do not download files whose local copy has the same size and
+                last-modified time (downloaded files get the remote last-modified as their mtime)
+
+        Each file is downloaded to a temporary file next to its destination and renamed into place,
+         so an interrupted run never leaves a partial file under the real name.
+
+        Returns a manifest, one dict per remote file:
+            {'adls_path', 'local_file', 'status': 'downloaded' | 'skipped' | 'failed', 'bytes', 'error'}
+        """
+        directory_path = directory_path.strip("/")
+        paths = self.list_directory_contents(
+            directory_path, recursive=True, print_tree=False, use_cache=False
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for adls_path in paths:
+                if adls_path.is_directory:
+                    continue
+                relative_path = adls_path.name[len(directory_path) :].strip("/")
+                local_file = os.path.join(local_path, *relative_path.split("/"))
+                futures.append(
+                    executor.submit(
+                        self._mirror_file, adls_path, local_file, max_concurrency, skip_unchanged
+                    )
+                )
+            return [future.result() for future in futures]
+
+    def _mirror_file(self, adls_path, local_file: str, max_concurrency: int, skip_unchanged: bool) -> dict:
+        result = {
+            "adls_path": adls_path.name,
+            "local_file": local_file,
+            "status": "failed",
+            "bytes": adls_path.content_length,
+            "error": None,
+        }
+        remote_mtime = adls_path.last_modified.timestamp()
+        try:
+            if skip_unchanged and os.path.isfile(local_file):
+                stat = os.stat(local_file)
+                if stat.st_size == adls_path.content_length and stat.st_mtime == remote_mtime:
+                    result["status"] = "skipped"
+                    return result
+            os.makedirs(os.path.dirname(local_file) or ".", exist_ok=True)
+            temp_file = os.path.join(
+                os.path.dirname(local_file), f".{os.path.basename(local_file)}.{uuid.uuid4().hex}.tmp"
+            )
+            try:
+                file_client = self.file_system_client.get_file_client(adls_path.name)
+                result["bytes"] = self._download_to_file(file_client, temp_file, max_concurrency)
+                os.utime(temp_file, (remote_mtime, remote_mtime))
+                os.replace(temp_file, local_file)
+            finally:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+            result["status"] = "downloaded"
+        except Exception as e:
+            result["error"] = str(e)
+        return result
 
     def upload_file_to_directory(
         self,
@@ -148,23 +640,364 @@ class AdlsConnection:
         file_name: str,
         adls_filename: str | None = None,
         overwrite=True,
-    ) -> None:
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> bool:
         """
         Uploads a local file to ADLS, by default this WILL overwrite an existing file of the same name
         (optional) use adls_filename to specify a different filename to create on ADLS
+        (optional) skip_unchanged: hash the local file and skip the upload if the remote file has the same hash
+            the hash is compared with the remote content_md5 (md5 only) or the 'content_{hash_algorithm}'
+            metadata field, both are set on every upload made with skip_unchanged
+            hash_algorithm is 'md5' or 'xxh64' (see compute_file_hash())
+
+        Returns True if the file was uploaded, False if it was skipped
         """
         try:
             if adls_filename:
                 remote_filename = adls_filename
             else:
                 remote_filename = file_name
+            filepath = os.path.join(local_path, file_name)
             file_client = directory_client.get_file_client(remote_filename)
-            with open(file=os.path.join(local_path, file_name), mode="rb") as data:
-                file_client.upload_data(data, overwrite=overwrite)
-        except ResourceModifiedError as e:
-            raise Exception(
-                f"Cannot upload file '{adls_file_name}' because it already exists on destination and you set 'overwrite=False'"
-            )
+            upload_kwargs = {}
+            if skip_unchanged:
+                digest = compute_file_hash(filepath, hash_algorithm)
+                if self._remote_hash_matches(file_client, hash_algorithm, digest):
+                    if self.logger:
+                        self.logger.debug(f"skipping unchanged {directory_client.path_name}/{remote_filename}")
+                    return False
+                upload_kwargs["metadata"] = {f"content_{hash_algorithm}": digest.hex()}
+                if hash_algorithm == "md5":
+                    upload_kwargs["content_settings"] = ContentSettings(content_md5=bytearray(digest))
+            with open(file=filepath, mode="rb") as data:
+                file_client.upload_data(data, overwrite=overwrite, **upload_kwargs)
+            self.invalidate_listing_cache(f"{directory_client.path_name}/{remote_filename}")
+            return True
+        except (ResourceExistsError, ResourceModifiedError) as e:
+            raise ResourceExistsError(
+                f"Cannot upload file '{remote_filename}' because it already exists on destination and you set 'overwrite=False'"
+            ) from e
+
+    def _remote_hash_matches(self, file_client, hash_algorithm: str, digest: bytes) -> bool:
+        """
+        True if the remote file exists and its content_md5 / 'content_{hash_algorithm}' metadata equals digest
+        """
+        try:
+            properties = file_client.get_file_properties()
+        except ResourceNotFoundError:
+            return False
+        metadata = properties.metadata or {}
+        if metadata.get(f"content_{hash_algorithm}") == digest.hex():
+            return True
+        content_settings = getattr(properties, "content_settings", None)
+        if hash_algorithm == "md5" and content_settings and content_settings.content_md5:
+            return bytes(content_settings.content_md5) == digest
+        return False
+
+    def upload_large_file_to_directory(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        local_path: str,
+        file_name: str,
+        adls_filename: str | None = None,
+        chunk_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        chunks_per_flush: int = 8,
+        progress_callback=None,
+        resume: bool = False,
+    ) -> int:
+        """
+        Uploads a large local file in chunks, this WILL overwrite an existing file of the same name
+         (unless resuming it)
+
+            chunk_size: bytes per append_data() request
+            max_concurrency: number of chunks appended in parallel (peak memory is about chunk_size * max_concurrency)
+            chunks_per_flush: the uploaded data is committed with flush_data() every this many chunks
+            progress_callback: called as progress_callback(bytes_committed, total_bytes) after every flush
+            resume: continue an interrupted upload from the last committed offset (the remote file's size)
+                instead of starting over. Only a remote file created by an upload of this same local file
+                (same size and mtime, stored as 'upload_id' metadata) is resumed, anything else is replaced
+
+        Returns the number of bytes committed
+        """
+        remote_filename = adls_filename if adls_filename else file_name
+        filepath = os.path.join(local_path, file_name)
+        stat = os.stat(filepath)
+        total_bytes = stat.st_size
+        upload_id = f"{stat.st_size}-{stat.st_mtime_ns}"
+        file_client = directory_client.get_file_client(remote_filename)
+
+        offset = 0
+        if resume:
+            try:
+                properties = file_client.get_file_properties()
+                if (properties.metadata or {}).get("upload_id") == upload_id:
+                    offset = properties.size
+                elif self.logger:
+                    self.logger.debug(f"'{remote_filename}' is not a partial upload of '{filepath}', starting over")
+            except ResourceNotFoundError:
+                offset = 0
+            if offset > total_bytes:
+                raise Exception(
+                    f"Cannot resume upload of '{remote_filename}', remote file is larger than '{filepath}'"
+                )
+        if offset == 0:
+            file_client.create_file(metadata={"upload_id": upload_id})
+
+        def _append_chunk(chunk_offset: int, length: int) -> None:
+            with open(filepath, "rb") as data:
+                data.seek(chunk_offset)
+                chunk = data.read(length)
+            file_client.append_data(chunk, offset=chunk_offset, length=len(chunk))
+
+        if total_bytes == 0:
+            file_client.flush_data(0)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            while offset < total_bytes:
+                segment_end = min(offset + chunk_size * chunks_per_flush, total_bytes)
+                futures = [
+                    executor.submit(_append_chunk, chunk_offset, min(chunk_size, segment_end - chunk_offset))
+                    for chunk_offset in range(offset, segment_end, chunk_size)
+                ]
+                for future in futures:
+                    future.result()
+                file_client.flush_data(segment_end)
+                offset = segment_end
+                if progress_callback:
+                    progress_callback(offset, total_bytes)
+
+        self.invalidate_listing_cache(f"{directory_client.path_name}/{remote_filename}")
+        return offset
+
+    def _upload_file_with_retry(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        local_path: str,
+        file_name: str,
+        adls_filename: str,
+        overwrite: bool,
+        retries: int,
+        backoff_seconds: float,
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> dict:
+        """
+        upload_file_to_directory() with retries and exponential backoff (with jitter)
+        returns this file's manifest entry instead of raising
+        """
+        result = {
+            "file_name": file_name,
+            "adls_filename": adls_filename,
+            "status": "failed",
+            "attempts": 0,
+            "bytes": None,
+            "seconds": None,
+            "error": None,
+        }
+        start = time.perf_counter()
+        self._call_with_retry(
+            result,
+            lambda: self.upload_file_to_directory(
+                directory_client,
+                local_path,
+                file_name,
+                adls_filename=adls_filename,
+                overwrite=overwrite,
+                skip_unchanged=skip_unchanged,
+                hash_algorithm=hash_algorithm,
+            ),
+            retries,
+            backoff_seconds,
+        )
+        if result["status"] in ["uploaded", "skipped"]:
+            result["bytes"] = os.path.getsize(os.path.join(local_path, file_name))
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _call_with_retry(self, result: dict, upload, retries: int, backoff_seconds: float) -> None:
+        """
+        Calls upload() until it succeeds or retries run out, waiting backoff_seconds * 2^n (with jitter)
+         between attempts. Records 'status', 'attempts' and 'error' in the result (manifest entry)
+         upload() returning False means the upload was skipped (unchanged)
+         only transient errors are retried (see is_transient_error()), e.g., not a missing local file,
+         an auth error or an existing file with overwrite=False
+        """
+        for attempt in range(1, retries + 2):
+            result["attempts"] = attempt
+            try:
+                uploaded = upload()
+                result["status"] = "skipped" if uploaded is False else "uploaded"
+                result["error"] = None
+                return
+            except Exception as e:
+                result["error"] = str(e)
+                if self.logger:
+                    self.logger.debug(f"upload attempt {attempt} of {result['adls_filename']} failed: {e}")
+                if not is_transient_error(e):
+                    return
+                if attempt <= retries:
+                    time.sleep(backoff_seconds * 2 ** (attempt - 1) * (0.5 + random.random()))
+
+    def _upload_data_with_retry(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        adls_file_name: str,
+        data: str | bytes,
+        overwrite: bool,
+        retries: int,
+        backoff_seconds: float,
+    ) -> dict:
+        if type(data) == str:
+            data = data.encode("utf-8")
+        result = {
+            "adls_filename": adls_file_name,
+            "status": "failed",
+            "attempts": 0,
+            "bytes": len(data),
+            "seconds": None,
+            "error": None,
+        }
+        start = time.perf_counter()
+        self._call_with_retry(
+            result,
+            lambda: self.upload_data_to_directory(directory_client, adls_file_name, data, overwrite=overwrite),
+            retries,
+            backoff_seconds,
+        )
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def upload_data_items(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        items,
+        overwrite=True,
+        max_workers: int = 8,
+        retries: int = 3,
+        backoff_seconds: float = 1.0,
+    ) -> list:
+        """
+        Uploads many small in-memory files to an ADLS directory concurrently
+
+            items: iterable (or generator) of (adls_file_name, data) pairs, data is str or bytes
+            max_workers: number of concurrent uploads, at most 2 * max_workers items are held at a time
+            retries: number of retries per item, see upload_files()
+
+        No metadata requests are made, each item is a single upload request.
+
+        Returns a manifest, one dict per item in input order:
+            {'adls_filename', 'status': 'uploaded' | 'failed', 'attempts', 'bytes', 'seconds', 'error'}
+        """
+        manifest = []
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for adls_file_name, data in items:
+                pending.append(
+                    executor.submit(
+                        self._upload_data_with_retry,
+                        directory_client,
+                        adls_file_name,
+                        data,
+                        overwrite,
+                        retries,
+                        backoff_seconds,
+                    )
+                )
+                if len(pending) >= 2 * max_workers:
+                    manifest.append(pending.popleft().result())
+            while pending:
+                manifest.append(pending.popleft().result())
+        return manifest
+
+    def upload_files(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        local_path: str,
+        file_names: list,
+        adls_filenames: list | None = None,
+        overwrite=True,
+        max_workers: int = 8,
+        retries: int = 3,
+        backoff_seconds: float = 1.0,
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> list:
+        """
+        Uploads many local files to an ADLS directory concurrently (bounded thread pool)
+
+            file_names: names of files in local_path (may include subfolders, e.g., 'sub/file.json')
+            adls_filenames: (optional) remote names, same order as file_names
+            max_workers: number of concurrent uploads
+            retries: number of retries per file, waiting backoff_seconds * 2^n (with jitter) between them
+            skip_unchanged: only upload files whose content hash differs from the remote copy,
+                see upload_file_to_directory()
+
+        Returns a manifest, one dict per file in the same order as file_names:
+            {'file_name', 'adls_filename', 'status': 'uploaded' | 'skipped' | 'failed', 'attempts', 'bytes', 'seconds', 'error'}
+        A failed file does not stop the others
+        """
+        if adls_filenames is None:
+            adls_filenames = [file_name.replace(os.sep, "/") for file_name in file_names]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._upload_file_with_retry,
+                    directory_client,
+                    local_path,
+                    file_name,
+                    adls_filename,
+                    overwrite,
+                    retries,
+                    backoff_seconds,
+                    skip_unchanged,
+                    hash_algorithm,
+                )
+                for file_name, adls_filename in zip(file_names, adls_filenames)
+            ]
+            return [future.result() for future in futures]
+
+    def upload_directory(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        local_path: str,
+        recursive: bool = False,
+        overwrite=True,
+        max_workers: int = 8,
+        retries: int = 3,
+        backoff_seconds: float = 1.0,
+        skip_unchanged: bool = False,
+        hash_algorithm: str = "md5",
+    ) -> list:
+        """
+        Uploads every (non-hidden) file in local_path to an ADLS directory, see upload_files()
+        recursive also uploads subfolders, keeping the same relative paths on ADLS
+        skip_unchanged only uploads new or changed files (compared by content hash)
+        """
+        file_names = []
+        if recursive:
+            for root, dirs, files in os.walk(local_path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for file in sorted(files):
+                    if not file.startswith("."):
+                        file_names.append(os.path.relpath(os.path.join(root, file), local_path))
+        else:
+            with os.scandir(local_path) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.is_file() and not entry.name.startswith("."):
+                        file_names.append(entry.name)
+        return self.upload_files(
+            directory_client,
+            local_path,
+            file_names,
+            overwrite=overwrite,
+            max_workers=max_workers,
+            retries=retries,
+            backoff_seconds=backoff_seconds,
+            skip_unchanged=skip_unchanged,
+            hash_algorithm=hash_algorithm,
+        )
 
     def upload_data_to_directory(
         self,
@@ -182,14 +1015,132 @@ class AdlsConnection:
             if type(data) == str:
                 data = data.encode("utf-8")
             file_client = directory_client.get_file_client(adls_file_name)
-            print(
-                f"directory_client.get_directory_properties().name: {directory_client.get_directory_properties().name}"
-            )
+            if self.logger:
+                self.logger.debug(
+                    f"uploading {len(data)} bytes to {directory_client.path_name}/{adls_file_name}"
+                )
             file_client.upload_data(data, overwrite=overwrite)
-        except ResourceModifiedError as e:
-            raise Exception(
+            self.invalidate_listing_cache(f"{directory_client.path_name}/{adls_file_name}")
+        except (ResourceExistsError, ResourceModifiedError) as e:
+            raise ResourceExistsError(
                 f"Cannot upload file '{adls_file_name}' because it already exists on destination and you set 'overwrite=False'"
+            ) from e
+
+    def invalidate_listing_cache(self, path: str | None = None) -> None:
+        """
+        Drop cached directory listings
+         path: drop listings of this path, its parents and its subdirectories
+         no path: drop every cached listing
+        """
+        with self._listing_cache_lock:
+            self._listing_cache_generation += 1
+            if path is None:
+                self._listing_cache.clear()
+                return
+            path = path.strip("/")
+            for directory_path, recursive in list(self._listing_cache):
+                if (
+                    not directory_path
+                    or path == directory_path
+                    or path.startswith(f"{directory_path}/")
+                    or directory_path.startswith(f"{path}/")
+                ):
+                    del self._listing_cache[(directory_path, recursive)]
+
+    def _get_directory_path(self, directory: str | DataLakeDirectoryClient) -> str:
+        if isinstance(directory, str):
+            return directory.strip("/")
+        elif hasattr(directory, "path_name"):
+            # DataLakeDirectoryClient knows its own path, no need for a get_directory_properties() round trip
+            return directory.path_name.strip("/")
+        raise Exception(
+            f"'{directory}' is not a valid path string or DataLakeDirectoryClient"
+        )
+
+    def iter_directory_contents(
+        self,
+        directory: str | DataLakeDirectoryClient,
+        recursive: bool = False,
+        use_cache: bool = True,
+    ) -> Iterator[AdlsPathRecord]:
+        """
+        Lazily iterates over the contents of a directory as AdlsPathRecord's
+         (name, is_directory, content_length, last_modified, etag)
+
+        Pages are fetched from ADLS as you iterate, unless a cached listing
+         (younger than listing_cache_ttl) exists. A fully iterated listing is cached if it has
+         at most listing_cache_max_entries entries, bigger listings are only streamed.
+        """
+        directory_path = self._get_directory_path(directory)
+        key = (directory_path, recursive)
+        caching = use_cache and self.listing_cache_ttl > 0
+        if caching:
+            cached = self._listing_cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                yield from cached[1]
+                return
+
+        generation = self._listing_cache_generation
+        records = []
+        paths = self.file_system_client.get_paths(path=directory_path, recursive=recursive)
+        for path in paths:
+            record = AdlsPathRecord(
+                path.name,
+                bool(path.is_directory),
+                path.content_length,
+                path.last_modified,
+                path.etag,
             )
+            if caching:
+                records.append(record)
+                if len(records) > self.listing_cache_max_entries:
+                    caching = False
+                    records = None
+            yield record
+
+        if caching:
+            with self._listing_cache_lock:
+                # don't cache a listing that was invalidated while we were reading it
+                if generation == self._listing_cache_generation:
+                    self._listing_cache[key] = (time.monotonic() + self.listing_cache_ttl, records)
+
+    def print_directory_contents(
+        self,
+        directory: str | DataLakeDirectoryClient,
+        recursive: bool = False,
+        print_tree=True,
+        print_list=False,
+    ) -> None:
+        """
+        Prints the contents of a directory as each page arrives (nothing is accumulated)
+         print_tree give an easy to read tree view
+         print_list gives a flatteneed list of paths
+        """
+        directory_path = self._get_directory_path(directory)
+        if print_tree:
+            self._print_tree(directory_path, self.iter_directory_contents(directory_path, recursive=recursive))
+        if print_list:
+            self._print_list(directory_path, self.iter_directory_contents(directory_path, recursive=recursive))
+
+    @staticmethod
+    def _tree_line(path) -> str:
+        indent = 2 * " " * path.name.count("/")
+        if path.is_directory:
+            return f"{indent}/{path.name.split('/')[-1]}"
+        return f"{indent}{path.name.split('/')[-1]}"
+
+    def _print_tree(self, directory_path: str, records) -> None:
+        print("---------------------------")
+        print(f"[{self.file_system_name}]/{directory_path}")
+        for path in records:
+            print(self._tree_line(path))
+
+    def _print_list(self, directory_path: str, records) -> None:
+        root = f"[{self.file_system_name}]/{directory_path}"
+        print("---------------------------")
+        print(root)
+        for path in records:
+            print(f"{root}/{path.name}")
 
     def list_directory_contents(
         self,
@@ -197,7 +1148,8 @@ class AdlsConnection:
         recursive: bool = False,
         print_tree=True,
         print_list=False,
-    ) -> ItemPaged:
+        use_cache: bool = True,
+    ) -> DirectoryListing:
         """
         Lists the contents of a directory
 
@@ -208,6 +1160,7 @@ class AdlsConnection:
             recursive lists all subdirectories
             print_tree give an easy to read tree view
             print_list gives a flatteneed list of paths
+            use_cache allows a cached listing (see iter_directory_contents())
 
 
         You can use the returned object as:
@@ -215,57 +1168,16 @@ class AdlsConnection:
             for item in items:
                 print(item.name)
 
+        The listing is printed when called, record by record as it is listed (nothing is kept).
+         Each iteration of the returned object lists the directory again (or uses the listing cache).
         """
-
-        def _print_directory_contents(
-            paths: ItemPaged, directory_path: str | None
-        ) -> None:
-            if directory_path is None:
-                return
-            else:
-                indent = ""
-                directory_path = directory_path.strip("/")
-                root = f"[{self.file_system_name}]/{directory_path}"
-                print_tree_items = [root]
-                print_list_items = [root]
-
-                for path in paths:
-                    if print_tree:
-                        indent = 2 * " " * str(path).count("/")
-                        if path.is_directory:
-                            print_tree_items.append(
-                                f"{indent}/{path.name.split('/')[-1]}"
-                            )
-                        else:
-                            print_tree_items.append(
-                                f"{indent}{path.name.split('/')[-1]}"
-                            )
-                    if print_list:
-                        print_list_items.append(f"{root}/{path.name}")
-                if print_tree:
-                    print("---------------------------")
-                    for item in print_tree_items:
-                        print(item)
-                if print_list:
-                    print("---------------------------")
-                    for item in print_list_items:
-                        print(item)
-
-        if type(directory) == str:
-            directory_path = directory
-        elif type(directory) == DataLakeDirectoryClient:
-            directory_path = directory.get_directory_properties().name
-        else:
-            directory_path = None
-            raise Exception(
-                f"'{directory}' is not a valid path string or DataLakeDirectoryClient"
+        directory_path = self._get_directory_path(directory)
+        if print_tree:
+            self._print_tree(
+                directory_path, self.iter_directory_contents(directory_path, recursive=recursive, use_cache=use_cache)
             )
-
-        paths = self.file_system_client.get_paths(
-            path=directory_path, recursive=recursive
-        )
-
-        if print_tree or print_list:
-            _print_directory_contents(paths, directory_path)
-
-        return paths
+        if print_list:
+            self._print_list(
+                directory_path, self.iter_directory_contents(directory_path, recursive=recursive, use_cache=use_cache)
+            )
+        return DirectoryListing(self, directory_path, recursive, use_cache)
@@ -0,0 +1,224 @@
+# pip install azure-storage-file-datalake azure-identity aiohttp
+"""
+# asyncio version of fileclient_adls.AdlsConnection, so uploads/downloads don't block the event loop
+#  (e.g., inside an othertools.AsyncConsumer consumer)
+
+# to import:
+from fileclient_adls_async import AsyncAdlsConnection
+
+# Example usage:
+    async with AsyncAdlsConnection(tenant_id, client_id, client_secret, account_url, file_system_name) as adls_conn:
+        directory_client = await adls_conn.create_daily_folders("folder/subfolder")
+        await adls_conn.upload_data_to_directory(directory_client, "file_2023_12_25.json", json_text)
+        async for item in adls_conn.list_directory_contents("folder/subfolder", recursive=True):
+            print(item.name)
+
+# All requests of one connection (including token requests) share one pooled aiohttp session,
+#  so create one connection and share it between your consumers.
+"""
+import aiohttp
+import asyncio
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.identity.aio import ClientSecretCredential
+from azure.storage.filedatalake.aio import DataLakeServiceClient, DataLakeDirectoryClient
+from typing import AsyncIterator
+import os
+import sys
+import time
+import path
+
+sys.path.append(path.Path(__file__).parent.abspath())
+from fileclient_adls import AdlsPathRecord
+
+
+class AsyncAdlsConnection:
+    # this class allows us to use an ADLS filesystem from asyncio code
+
+    def __init__(
+        self,
+        tenant_id: str,
+        client_id: str,
+        client_secret: str,
+        account_url: str,
+        file_system_name: str,
+        disable_http_logging: bool = True,
+        download_chunk_size: int = 4 * 1024 * 1024,
+        connection_pool_size: int = 100,
+    ) -> None:
+        """
+        Store connection settings, the connection itself is opened by 'async with' (or open())
+        account_url should look like: 'https://adt-calfit-adls@adtedfdatalake.dfs.core.windows.net/'
+        file_system_name should look like: 'adt-calfit-adls'
+        download_chunk_size is the size of each ranged GET when downloading
+        connection_pool_size is the maximum number of open sockets shared by all requests
+        """
+        if disable_http_logging:
+            import logging
+
+            azure_http_logger = logging.getLogger(
+                "azure.core.pipeline.policies.http_logging_policy"
+            )
+            azure_http_logger.setLevel(logging.WARNING)  # this was too talky
+
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self._client_secret = client_secret
+        self.account_url = account_url
+        self.file_system_name = file_system_name
+        self.download_chunk_size = download_chunk_size
+        self.connection_pool_size = connection_pool_size
+        self.session = None
+        self.credential = None
+        self.service_client = None
+        self.file_system_client = None
+        self._known_directories = set()
+
+    async def open(self) -> "AsyncAdlsConnection":
+        """
+        Setup the shared HTTP session and authenticate to ADLS (must be called from a running event loop)
+        """
+        # proxy settings from the environment and no cookies, like the session AioHttpTransport makes itself
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connection_pool_size),
+            trust_env=True,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        transport = AioHttpTransport(session=self.session, session_owner=False)
+        self.credential = ClientSecretCredential(
+            self.tenant_id, self.client_id, self._client_secret, transport=transport
+        )
+        self.service_client = DataLakeServiceClient(
+            account_url=self.account_url,
+            credential=self.credential,
+            transport=transport,
+            max_single_get_size=self.download_chunk_size,
+            max_chunk_get_size=self.download_chunk_size,
+        )
+        self.file_system_client = self.service_client.get_file_system_client(
+            file_system=self.file_system_name
+        )
+        return self
+
+    async def close(self) -> None:
+        if self.service_client is not None:
+            await self.service_client.close()
+        if self.credential is not None:
+            await self.credential.close()
+        if self.session is not None:
+            await self.session.close()
+        self.session = None
+        self.credential = None
+        self.service_client = None
+        self.file_system_client = None
+
+    async def __aenter__(self) -> "AsyncAdlsConnection":
+        return await self.open()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def get_directory(self, directory_path: str) -> DataLakeDirectoryClient:
+        """
+        returns an object to interact with a specific directory in ADLS filesystem (no request is made)
+        """
+        return self.file_system_client.get_directory_client(directory_path)
+
+    async def create_directory(self, directory_path: str) -> DataLakeDirectoryClient:
+        """
+        Create a directory, this is idempotent, see AdlsConnection.create_directory()
+        Directories created through this connection (and their parents) are remembered,
+         so creating them again does not make a request
+        """
+        normalized_path = directory_path.strip("/")
+        if normalized_path in self._known_directories:
+            return self.get_directory(directory_path)
+        directory_client = await self.file_system_client.create_directory(directory_path)
+        path_elements = normalized_path.split("/")
+        for i in range(1, len(path_elements) + 1):
+            self._known_directories.add("/".join(path_elements[:i]))
+        return directory_client
+
+    async def create_daily_folders(self, basepath: str) -> DataLakeDirectoryClient:
+        """
+        Get or create /basepath/year/month/day for today with a single create call
+         (ADLS creates the missing parents)
+        """
+        year = time.strftime("%Y")
+        month = time.strftime("%m")
+        day = time.strftime("%d")
+        return await self.create_directory(f"/{basepath}/{year}/{month}/{day}")
+
+    async def upload_data_to_directory(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        adls_file_name: str,
+        data: str | bytes,
+        overwrite=True,
+    ) -> None:
+        """
+        Uploads data to create a new file on ADLS, by default this WILL overwrite an existing file of the same name
+        data can be either str or bytes (utf-8 encoding)
+        str will be converted to bytes (utf-8 encoding)
+        """
+        try:
+            if type(data) == str:
+                data = data.encode("utf-8")
+            file_client = directory_client.get_file_client(adls_file_name)
+            await file_client.upload_data(data, overwrite=overwrite)
+        except (ResourceExistsError, ResourceModifiedError) as e:
+            raise ResourceExistsError(
+                f"Cannot upload file '{adls_file_name}' because it already exists on destination and you set 'overwrite=False'"
+            ) from e
+
+    async def download_file_from_directory(
+        self,
+        directory_client: DataLakeDirectoryClient,
+        local_path: str,
+        local_file_name: str,
+        adls_file_name: str,
+        max_concurrency: int = 1,
+    ) -> int:
+        """
+        Downloads an ADLS file to a local file, streaming it in download_chunk_size pieces
+         the local file is opened/written/closed in a worker thread, so disk I/O doesn't block the event loop
+        Returns the number of bytes written
+        """
+        file_client = directory_client.get_file_client(adls_file_name)
+        download = await file_client.download_file(max_concurrency=max_concurrency)
+        local_file = await asyncio.to_thread(open, os.path.join(local_path, local_file_name), "wb")
+        try:
+            size = 0
+            async for chunk in download.chunks():
+                await asyncio.to_thread(local_file.write, chunk)
+                size += len(chunk)
+        finally:
+            await asyncio.to_thread(local_file.close)
+        return size
+
+    async def list_directory_contents(
+        self,
+        directory: str | DataLakeDirectoryClient,
+        recursive: bool = False,
+    ) -> AsyncIterator[AdlsPathRecord]:
+        """
+        Lazily iterates over the contents of a directory as AdlsPathRecord's, fetching pages as you go:
+            async for item in adls_conn.list_directory_contents("folder/subfolder"):
+                print(item.name)
+        """
+        if isinstance(directory, str):
+            directory_path = directory.strip("/")
+        elif hasattr(directory, "path_name"):
+            directory_path = directory.path_name.strip("/")
+        else:
+            raise Exception(
+                f"'{directory}' is not a valid path string or DataLakeDirectoryClient"
+            )
+        async for item in self.file_system_client.get_paths(path=directory_path, recursive=recursive):
+            yield AdlsPathRecord(
+                item.name,
+                bool(item.is_directory),
+                item.content_length,
+                item.last_modified,
+                item.etag,
+            )
@@ -0,0 +1,417 @@
+"""
+# Local disk stand-in for fileclient_adls.AdlsConnection
+#  runs the same pipeline code without an Azure account, e.g., for tests and offline benchmarks
+
+# to import:
+from fileclient_local import LocalStorageConnection
+
+# Example usage:
+    # every ADLS path is stored under root_dir, e.g., 'folder/2023/12/25/file.json' -> '{root_dir}/folder/2023/12/25/file.json'
+    storage = LocalStorageConnection("./fake_adls")
+    # (optional) simulate the network: each request waits latency_seconds + bytes / bandwidth_bytes_per_second
+    storage = LocalStorageConnection("./fake_adls", latency_seconds=0.05, bandwidth_bytes_per_second=50 * 1024 * 1024)
+
+    directory_client = storage.create_daily_folders("folder")
+    storage.upload_files(directory_client, "./output", file_names, max_workers=8)
+
+# Both classes implement fileclient_adls.StorageBackend, so you can write functions as:
+    def ship_files(storage: StorageBackend, ...):
+
+# Run this as a script to benchmark upload/download concurrency against a simulated network:
+    python fileclient_local.py [latency_seconds] [bandwidth_MB_per_second]
+"""
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from logging import Logger
+import datetime
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+import path
+
+sys.path.append(path.Path(__file__).parent.abspath())
+from fileclient_adls import AdlsConnection
+
+
+class SimulatedNetwork:
+    # delays each request by latency + transfer time, all delays are 0 by default
+
+    def __init__(self, latency_seconds: float = 0.0, bandwidth_bytes_per_second: float | None = None) -> None:
+        self.latency_seconds = latency_seconds
+        self.bandwidth_bytes_per_second = bandwidth_bytes_per_second
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def request(self, size: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+        delay = self.latency_seconds
+        if self.bandwidth_bytes_per_second:
+            delay += size / self.bandwidth_bytes_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LocalDownloader:
+    # stand-in for StorageStreamDownloader, reads a local file in chunks
+
+    def __init__(self, filepath: str, chunk_size: int, max_concurrency: int, network: SimulatedNetwork) -> None:
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.network = network
+        self.size = os.path.getsize(filepath)
+
+    def _read_range(self, offset: int) -> bytes:
+        with open(self.filepath, "rb") as f:
+            f.seek(offset)
+            data = f.read(self.chunk_size)
+        self.network.request(len(data))
+        return data
+
+    def chunks(self):
+        for offset in range(0, self.size, self.chunk_size):
+            yield self._read_range(offset)
+
+    def readinto(self, stream) -> int:
+        # ranges are fetched max_concurrency at a time and written in order
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for offset in range(0, self.size, self.chunk_size):
+                pending.append(executor.submit(self._read_range, offset))
+                if len(pending) >= self.max_concurrency:
+                    stream.write(pending.popleft().result())
+            while pending:
+                stream.write(pending.popleft().result())
+        return self.size
+
+    def readall(self) -> bytes:
+        return b"".join(self.chunks())
+
+
+class LocalPathClient:
+    # common parts of the file/directory stand-ins
+
+    def __init__(self, file_system, path_name: str) -> None:
+        self.file_system = file_system
+        self.file_system_name = file_system.name
+        self.path_name = path_name.strip("/")
+
+    @property
+    def local_path(self) -> str:
+        return self.file_system.local_path(self.path_name)
+
+
+class LocalFileClient(LocalPathClient):
+    # stand-in for DataLakeFileClient
+
+    def upload_data(self, data, overwrite=True, **kwargs) -> None:
+        if hasattr(data, "read"):
+            data = data.read()
+        if type(data) == str:
+            data = data.encode("utf-8")
+        if not overwrite and os.path.exists(self.local_path):
+            raise ResourceExistsError(f"The specified path '{self.path_name}' already exists")
+        self.file_system.network.request(len(data))
+        self.file_system.write_file(self.path_name, data)
+        self.file_system.set_stored_properties(self.path_name, kwargs.get("content_settings"), kwargs.get("metadata"))
+
+    def download_file(self, offset=None, length=None, max_concurrency: int = 1, **kwargs) -> LocalDownloader:
+        if not os.path.isfile(self.local_path):
+            raise ResourceNotFoundError(f"The specified path '{self.path_name}' does not exist")
+        self.file_system.network.request()
+        return LocalDownloader(
+            self.local_path, self.file_system.chunk_size, max_concurrency, self.file_system.network
+        )
+
+    def create_file(self, **kwargs) -> None:
+        self.file_system.network.request()
+        self.file_system.write_file(self.path_name, b"")
+        self.file_system.drop_uncommitted(self.path_name)
+        self.file_system.set_stored_properties(self.path_name, None, kwargs.get("metadata"))
+
+    def append_data(self, data, offset: int, length: int | None = None, **kwargs) -> None:
+        self.file_system.network.request(len(data))
+        self.file_system.add_uncommitted(self.path_name, offset, bytes(data))
+
+    def flush_data(self, offset: int, **kwargs) -> None:
+        self.file_system.network.request()
+        self.file_system.commit(self.path_name, offset)
+
+    def get_file_properties(self, **kwargs):
+        if not os.path.isfile(self.local_path):
+            raise ResourceNotFoundError(f"The specified path '{self.path_name}' does not exist")
+        self.file_system.network.request()
+        return self.file_system.path_properties(self.path_name)
+
+
+class LocalDirectoryClient(LocalPathClient):
+    # stand-in for DataLakeDirectoryClient
+
+    def get_file_client(self, file_name: str) -> LocalFileClient:
+        return LocalFileClient(self.file_system, f"{self.path_name}/{file_name}")
+
+    def get_sub_directory_client(self, sub_directory: str) -> "LocalDirectoryClient":
+        return LocalDirectoryClient(self.file_system, f"{self.path_name}/{sub_directory}")
+
+    def get_directory_properties(self, **kwargs):
+        if not os.path.isdir(self.local_path):
+            raise ResourceNotFoundError(f"The specified path '{self.path_name}' does not exist")
+        self.file_system.network.request()
+        return self.file_system.path_properties(self.path_name)
+
+    def delete_directory(self, **kwargs) -> None:
+        self.file_system.network.request()
+        shutil.rmtree(self.local_path)
+        shutil.rmtree(self.file_system.properties_path(self.path_name), ignore_errors=True)
+
+    def rename_directory(self, new_name: str, **kwargs) -> "LocalDirectoryClient":
+        # new_name is '{file_system_name}/{new_path}', as for DataLakeDirectoryClient
+        new_path = new_name.split("/", 1)[1] if "/" in new_name else new_name
+        self.file_system.network.request()
+        new_local_path = self.file_system.local_path(new_path)
+        os.makedirs(os.path.dirname(new_local_path), exist_ok=True)
+        os.replace(self.local_path, new_local_path)
+        properties_path = self.file_system.properties_path(self.path_name)
+        if os.path.isdir(properties_path):
+            new_properties_path = self.file_system.properties_path(new_path)
+            os.makedirs(os.path.dirname(new_properties_path), exist_ok=True)
+            os.replace(properties_path, new_properties_path)
+        return LocalDirectoryClient(self.file_system, new_path)
+
+
+class LocalFileSystemClient:
+    # stand-in for FileSystemClient, stores the file system under root_dir
+    #  content settings and metadata of uploaded files are kept in '{root_dir}/.properties/{path}.json'
+
+    PROPERTIES_DIR = ".properties"
+    # write_file() temp files, '{name}.{uuid hex}.tmp'
+    TEMP_FILE_PATTERN = re.compile(r"\.[0-9a-f]{32}\.tmp$")
+
+    def __init__(self, root_dir: str, name: str, network: SimulatedNetwork, chunk_size: int) -> None:
+        self.root_dir = os.path.abspath(root_dir)
+        self.name = name
+        self.network = network
+        self.chunk_size = chunk_size
+        # path_name -> {offset: data} appended but not flushed yet
+        self._uncommitted = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def local_path(self, path_name: str) -> str:
+        path_name = path_name.strip("/")
+        return os.path.join(self.root_dir, *path_name.split("/")) if path_name else self.root_dir
+
+    def write_file(self, path_name: str, data: bytes) -> None:
+        # write to a temp file and rename, so readers never see a partial file
+        local_path = self.local_path(path_name)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        temp_path = f"{local_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, local_path)
+
+    def properties_path(self, path_name: str) -> str:
+        return os.path.join(self.root_dir, self.PROPERTIES_DIR, *path_name.strip("/").split("/"))
+
+    def set_stored_properties(self, path_name: str, content_settings=None, metadata: dict | None = None) -> None:
+        content_md5 = getattr(content_settings, "content_md5", None)
+        properties = {
+            "content_md5": bytes(content_md5).hex() if content_md5 else None,
+            "metadata": metadata or {},
+        }
+        properties_path = f"{self.properties_path(path_name)}.json"
+        os.makedirs(os.path.dirname(properties_path), exist_ok=True)
+        with open(properties_path, "w") as f:
+            json.dump(properties, f)
+
+    def get_stored_properties(self, path_name: str) -> dict:
+        try:
+            with open(f"{self.properties_path(path_name)}.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"content_md5": None, "metadata": {}}
+
+    def add_uncommitted(self, path_name: str, offset: int, data: bytes) -> None:
+        with self._lock:
+            self._uncommitted.setdefault(path_name, {})[offset] = data
+
+    def drop_uncommitted(self, path_name: str) -> None:
+        with self._lock:
+            self._uncommitted.pop(path_name, None)
+
+    def commit(self, path_name: str, offset: int) -> None:
+        """
+        append the uncommitted data up to offset to the file, discard the rest (like flush_data())
+        """
+        with self._lock:
+            pending = self._uncommitted.pop(path_name, {})
+        local_path = self.local_path(path_name)
+        with open(local_path, "ab") as f:
+            position = f.tell()
+            while position < offset:
+                if position not in pending:
+                    raise Exception(f"Cannot flush '{path_name}' to {offset}, no data appended at {position}")
+                data = pending.pop(position)
+                f.write(data)
+                position += len(data)
+
+    def path_properties(self, path_name: str):
+        local_path = self.local_path(path_name)
+        stat = os.stat(local_path)
+        is_directory = os.path.isdir(local_path)
+        stored = {"content_md5": None, "metadata": {}} if is_directory else self.get_stored_properties(path_name)
+        content_md5 = bytearray.fromhex(stored["content_md5"]) if stored["content_md5"] else None
+        return types.SimpleNamespace(
+            name=path_name,
+            is_directory=is_directory,
+            content_length=0 if is_directory else stat.st_size,
+            size=0 if is_directory else stat.st_size,
+            last_modified=datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc),
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            metadata=stored["metadata"],
+            content_settings=types.SimpleNamespace(content_md5=content_md5),
+        )
+
+    def get_directory_client(self, directory_path: str) -> LocalDirectoryClient:
+        return LocalDirectoryClient(self, directory_path)
+
+    def get_file_client(self, file_path: str) -> LocalFileClient:
+        return LocalFileClient(self, file_path)
+
+    def create_directory(self, directory_path: str, **kwargs) -> LocalDirectoryClient:
+        self.network.request()
+        os.makedirs(self.local_path(directory_path), exist_ok=True)
+        return LocalDirectoryClient(self, directory_path)
+
+    def get_paths(self, path: str | None = None, recursive: bool = True, **kwargs):
+        """
+        Generator of path properties under path, sorted like ADLS (directories before their contents)
+        """
+        path = (path or "").strip("/")
+        local_path = self.local_path(path)
+        if not os.path.isdir(local_path):
+            raise ResourceNotFoundError(f"The specified path '{path}' does not exist")
+        self.network.request()
+        for name in sorted(os.listdir(local_path)):
+            if self.TEMP_FILE_PATTERN.search(name) or (not path and name == self.PROPERTIES_DIR):
+                continue
+            path_name = f"{path}/{name}" if path else name
+            yield self.path_properties(path_name)
+            if recursive and os.path.isdir(self.local_path(path_name)):
+                yield from self.get_paths(path_name, recursive=True)
+
+
+class LocalServiceClient:
+    # stand-in for DataLakeServiceClient, each file system is a folder of root_dir
+
+    def __init__(self, root_dir: str, network: SimulatedNetwork, chunk_size: int) -> None:
+        self.root_dir = root_dir
+        self.network = network
+        self.chunk_size = chunk_size
+
+    def get_file_system_client(self, file_system: str) -> LocalFileSystemClient:
+        return LocalFileSystemClient(
+            os.path.join(self.root_dir, file_system), file_system, self.network, self.chunk_size
+        )
+
+
+class LocalStorageConnection(AdlsConnection):
+    """
+    AdlsConnection backed by a local folder instead of Azure Data Lake
+     every AdlsConnection method works the same way (uploads, downloads, listings, caches)
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        file_system_name: str = "local",
+        latency_seconds: float = 0.0,
+        bandwidth_bytes_per_second: float | None = None,
+        download_chunk_size: int = 4 * 1024 * 1024,
+        listing_cache_ttl: float = 30.0,
+        listing_cache_max_entries: int = 100_000,
+        use_logger: Logger = None,
+    ) -> None:
+        """
+        root_dir is where the file systems are stored ('{root_dir}/{file_system_name}/...')
+        latency_seconds is added to every request
+        bandwidth_bytes_per_second (optional) adds transfer time to every request that carries data
+        the other arguments are the same as for AdlsConnection
+        """
+        self._init_connection_state(
+            download_chunk_size, listing_cache_ttl, listing_cache_max_entries, use_logger
+        )
+        self.network = SimulatedNetwork(latency_seconds, bandwidth_bytes_per_second)
+        self.service_client = LocalServiceClient(root_dir, self.network, download_chunk_size)
+        self.file_system_name = file_system_name
+        self.file_system_client = self.service_client.get_file_system_client(
+            file_system=file_system_name
+        )
+
+
+def benchmark_concurrency(
+    latency_seconds: float = 0.05,
+    bandwidth_bytes_per_second: float | None = 20 * 1024 * 1024,
+    number_of_files: int = 64,
+    file_size: int = 256 * 1024,
+    concurrency_levels: list | None = None,
+) -> list:
+    """
+    Time upload_files() and download_directory() at different max_workers against a simulated network
+
+    Returns a list of {'max_workers', 'upload_seconds', 'download_seconds'}
+    """
+    if concurrency_levels is None:
+        concurrency_levels = [1, 2, 4, 8, 16, 32]
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_dir = os.path.join(temp_dir, "local")
+        os.makedirs(local_dir)
+        file_names = []
+        for i in range(number_of_files):
+            file_name = f"file_{i:04d}.bin"
+            with open(os.path.join(local_dir, file_name), "wb") as f:
+                f.write(os.urandom(file_size))
+            file_names.append(file_name)
+
+        for max_workers in concurrency_levels:
+            storage = LocalStorageConnection(
+                os.path.join(temp_dir, f"remote_{max_workers}"),
+                latency_seconds=latency_seconds,
+                bandwidth_bytes_per_second=bandwidth_bytes_per_second,
+            )
+            directory_client = storage.create_directory("benchmark")
+            start = time.perf_counter()
+            storage.upload_files(directory_client, local_dir, file_names, max_workers=max_workers)
+            upload_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            storage.download_directory(
+                "benchmark", os.path.join(temp_dir, f"mirror_{max_workers}"), max_workers=max_workers
+            )
+            download_seconds = time.perf_counter() - start
+            results.append(
+                {
+                    "max_workers": max_workers,
+                    "upload_seconds": round(upload_seconds, 3),
+                    "download_seconds": round(download_seconds, 3),
+                }
+            )
+    return results
+
+
+if __name__ == "__main__":
+    latency_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+    bandwidth = float(sys.argv[2]) * 1024 * 1024 if len(sys.argv) > 2 else 20 * 1024 * 1024
+    print(f"simulated network: {latency_seconds}s latency, {bandwidth / (1024 * 1024):.0f} MB/s per request")
+    print(f"{'max_workers':>11} {'upload s':>9} {'download s':>11}")
+    for result in benchmark_concurrency(latency_seconds, bandwidth):
+        print(f"{result['max_workers']:>11} {result['upload_seconds']:>9} {result['download_seconds']:>11}")
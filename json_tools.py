@@ -0,0 +1,126 @@
+"""
+# Shared JSON tools module
+
+# to import:
+from json_tools import json_loads, json_dumps, json_dumps_bytes
+
+# The fastest installed backend is used for compact output and fast loads, in this order:
+    orjson, msgspec, ujson, json (stdlib, always available)
+    pip install orjson
+
+# The fast backends are lossy on some input, so loads use stdlib unless you ask for fast=True:
+    - orjson/msgspec parse integers larger than 64 bits as floats (2**70 -> 1.1805916207174113e+21)
+    - orjson/msgspec reject NaN/Infinity, which stdlib (and json_dumps() pretty output) writes
+    - orjson/msgspec write NaN/Infinity as null, so compact output with them falls back to stdlib
+
+# Example usage:
+    data = json_loads(raw_str_or_bytes)
+    data = json_loads(raw_str_or_bytes, fast=True)   # fast backend, for data you know fits in it
+    text = json_dumps(data)                 # pretty (indent=4), identical to json.dumps(data, indent=4)
+    text = json_dumps(data, compact=True)   # compact, for machine-consumed files (uses the fast backend)
+
+# To force a backend (e.g., for benchmarks):
+    set_json_backend("json")
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _stdlib_dumps_bytes(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _has_non_finite_float(obj) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite_float(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite_float(value) for value in obj)
+    return False
+
+
+# backend name: (loads(str | bytes), compact dumps(obj) -> bytes), fastest first
+_BACKENDS = {}
+if orjson is not None:
+    _BACKENDS["orjson"] = (
+        orjson.loads,
+        lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+    )
+if msgspec is not None:
+    _BACKENDS["msgspec"] = (msgspec.json.decode, msgspec.json.encode)
+if ujson is not None:
+    _BACKENDS["ujson"] = (
+        ujson.loads,
+        lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8"),
+    )
+_BACKENDS["json"] = (json.loads, _stdlib_dumps_bytes)
+
+JSON_BACKENDS = list(_BACKENDS)
+JSON_BACKEND = JSON_BACKENDS[0]
+
+
+def set_json_backend(name: str) -> None:
+    """
+    Force the JSON backend, name is one of JSON_BACKENDS (the installed backends)
+    """
+    global JSON_BACKEND
+    if name not in _BACKENDS:
+        raise Exception(f"JSON backend '{name}' is not available, choose one of {JSON_BACKENDS}")
+    JSON_BACKEND = name
+
+
+def json_loads(data: str | bytes, fast: bool = False):
+    """
+    Parse JSON text (str or utf-8 bytes)
+     fast=False: stdlib json, lossless
+     fast=True: the current backend, see the module notes on what it can't round trip
+    """
+    if fast:
+        return _BACKENDS[JSON_BACKEND][0](data)
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj, compact: bool = True) -> bytes:
+    """
+    Serialize obj to utf-8 JSON bytes, see json_dumps()
+    """
+    if not compact:
+        return json.dumps(obj, indent=4).encode("utf-8")
+    try:
+        data = _BACKENDS[JSON_BACKEND][1](obj)
+    except (TypeError, OverflowError):
+        # e.g., integers too large for the fast backend, stdlib raises its own error if it is really invalid
+        return _stdlib_dumps_bytes(obj)
+    # orjson/msgspec write NaN/Infinity as null, only look for them when the output has a null
+    if b"null" in data and _has_non_finite_float(obj):
+        return _stdlib_dumps_bytes(obj)
+    return data
+
+
+def json_dumps(obj, compact: bool = False) -> str:
+    """
+    Serialize obj to a JSON str
+
+    compact=False: pretty printed with indent=4 (stdlib, same output as before the backend layer existed)
+    compact=True: no whitespace, serialized with the fastest installed backend
+                  (NaN/Infinity and integers over 64 bits fall back to stdlib, so the output round trips)
+    """
+    if not compact:
+        return json.dumps(obj, indent=4)
+    return json_dumps_bytes(obj, compact=True).decode("utf-8")
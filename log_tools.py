@@ -45,16 +45,15 @@ DecoratedFunc = Callable[Param, RetType]
 
 def log_exceptions(func:OriginalFunc=None, re_raise: Optional[bool]=True, logger: Optional[logging.Logger]=None) -> DecoratedFunc:
     if func is None:
-        return functools.partial(log_exceptions, re_raise=re_raise)
+        return functools.partial(log_exceptions, re_raise=re_raise, logger=logger)
 
     @functools.wraps(func)
     def decorated(*args, **kwargs) -> RetType:
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            if logger is None:
-                logger = logging.getLogger(func.__name__)
-            logger.exception(f"Exception raised in {func.__name__}. exception: {str(e)}")
+            use_logger = logger or logging.getLogger(func.__name__)
+            use_logger.exception(f"Exception raised in {func.__name__}. exception: {str(e)}")
             if re_raise:
                 raise e
 
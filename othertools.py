@@ -7,7 +7,18 @@ import asyncio
 import base64
 import os
 import path
+import random
+import time
 import argparse
+import json
+import collections.abc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 my_path = path.Path(__file__).parent.abspath()
 with open(f"{my_path / 'settings_template.yml'}", "r") as f:
@@ -36,22 +47,401 @@ def argument_loader(arg_map: dict, parser: argparse.ArgumentParser):
     
     return parser
 
+class TokenBucket:
+    # allows rate acquire() calls per second on average, with bursts of up to burst calls
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # the lock makes waiters take their turn in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ConsumerMetrics:
+    # counters and latencies of a bounded AsyncConsumer run, see AsyncConsumer.get_metrics()
+
+    def __init__(self, latency_samples: int = 10_000):
+        self.started = None
+        self.finished = None
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.max_queue_depth = 0
+        # latencies of the most recent items only, so memory stays flat on long runs
+        self.latencies = deque(maxlen=latency_samples)
+
+    def record(self, seconds: float, succeeded: bool):
+        self.latencies.append(seconds)
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def observe_queue_depth(self, depth: int):
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def summary(self, queue_depth: int = 0, out_queue_depth: int = 0) -> dict:
+        items = self.succeeded + self.failed
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+        return {
+            "items": items,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(items / elapsed, 1) if elapsed else None,
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "out_queue_depth": out_queue_depth,
+            "latency_ms": {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99), "max": percentile(100)},
+        }
+
+
+def _apply_cpu_stage(cpu_stage, batch: list) -> list:
+    # runs in the executor, one call per batch to save on IPC, an exception replaces the item's result
+    results = []
+    for item in batch:
+        try:
+            results.append(cpu_stage(item))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# put on the queue once per consumer in bounded mode, tells it there are no more items
+_END_OF_ITEMS = object()
+# put on the out_queue by stream() when all consumers are done
+_END_OF_RESULTS = object()
+
+
 class AsyncConsumer:
-    def __init__(self, number_of_consumers: int, consumer, items):
+    """
+    Runs number_of_consumers coroutines over items
+
+    Default mode: items are all queued first, then consumer(queue, out_queue) coroutines drain the queue
+        run() returns the list of what each consumer returned
+
+    Bounded mode (bounded=True): the producer and consumers run at the same time
+        consumer(item) is called once per item and returns that item's result
+        items can be an iterable or an async iterable (e.g., an async generator reading endpoints)
+        at most max_queue_size items wait in memory, the producer waits for consumers when the queue is full
+        run() returns the results in the order they finished, an exception raised by consumer(item) is
+         returned in place of its result (like gather(return_exceptions=True))
+
+        async def poll(endpoint):
+            return await get_endpoint_data(endpoint)
+        results = await AsyncConsumer(100, poll, endpoints, bounded=True).run()
+
+        bounded mode options to go easy on the targets:
+            rate_limit: start at most rate_limit items per second (token bucket, bursts of up to rate_burst)
+            max_per_host: at most max_per_host items with the same host_key(item) are processed at once,
+             items of a busy host are parked so the consumers keep working on other hosts (retries keep the slot)
+            item_timeout: seconds before a consumer(item) call is cancelled (raises TimeoutError)
+            retries: number of retries of a failed/timed out item, waiting backoff_seconds * 2^n (with jitter)
+        get_metrics() returns throughput, queue depth and latency percentiles, also while running
+
+        hybrid mode, for consumers that parse/transform large responses:
+            cpu_stage(result) is run on each consumer(item) result in a process pool (cpu_executor="process",
+             cpu_stage must be a module level function) or a thread pool (cpu_executor="thread", for work that
+             releases the GIL), so the event loop keeps polling meanwhile
+            results are sent in batches of cpu_batch_size, or after cpu_batch_timeout_ms, to save on IPC
+            results that are exceptions skip cpu_stage
+
+    Instead of run(), stream() yields results as they arrive through out_queue (both modes),
+     optionally in batches of batch_size results or batch_timeout_ms, whichever comes first:
+        async for batch in AsyncConsumer(100, poll, endpoints, bounded=True).stream(batch_size=500, batch_timeout_ms=1000):
+            to_jsonl_file(batch, filename, append=True)
+    """
+
+    def __init__(
+        self,
+        number_of_consumers: int,
+        consumer,
+        items,
+        bounded: bool = False,
+        max_queue_size: int = 1000,
+        rate_limit: float | None = None,
+        rate_burst: int = 1,
+        host_key=None,
+        max_per_host: int | None = None,
+        item_timeout: float | None = None,
+        retries: int = 0,
+        backoff_seconds: float = 0.5,
+        cpu_stage=None,
+        cpu_executor: str = "process",
+        cpu_workers: int | None = None,
+        cpu_batch_size: int = 16,
+        cpu_batch_timeout_ms: float | None = 50,
+    ):
+        if not bounded and (rate_limit or max_per_host or item_timeout or retries or cpu_stage):
+            raise Exception("rate_limit, max_per_host, item_timeout, retries and cpu_stage need bounded=True")
+        if cpu_executor not in ["process", "thread"]:
+            raise Exception(f"cpu_executor must be 'process' or 'thread', not '{cpu_executor}'")
+        if max_per_host and host_key is None:
+            raise Exception("max_per_host needs a host_key function, e.g., host_key=lambda item: item['host']")
         self.number_of_consumers = number_of_consumers
-        self.queue = asyncio.Queue()
-        self.out_queue = asyncio.Queue()
+        self.bounded = bounded
+        self.queue = asyncio.Queue(maxsize=max_queue_size if bounded else 0)
+        self.out_queue = asyncio.Queue(maxsize=max_queue_size if bounded else 0)
         self.consumer = consumer
         self.items = items
         self.endpiointData = []
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self.host_key = host_key
+        self.max_per_host = max_per_host
+        # host -> number of its items being processed, and host -> deque of its items parked until a slot frees up
+        self._host_active = {}
+        self._host_pending = {}
+        self._parked = 0
+        self._host_released = asyncio.Condition()
+        self.item_timeout = item_timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.metrics = ConsumerMetrics()
+        self.cpu_stage = cpu_stage
+        self.cpu_executor = cpu_executor
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.cpu_batch_size = cpu_batch_size
+        self.cpu_batch_timeout_ms = cpu_batch_timeout_ms
         # self.consumers_list = self.consume(self.number_of_consumers)
 
     async def produce(self):
-        for item in self.items:
-            await self.queue.put(item)
-            # print(f'producing {item}...') only for debugging
+        if hasattr(self.items, "__aiter__"):
+            async for item in self.items:
+                await self.queue.put(item)
+        else:
+            for item in self.items:
+                await self.queue.put(item)
+                # print(f'producing {item}...') only for debugging
+
+    async def _produce_then_stop(self):
+        await self.produce()
+        for _ in range(self.number_of_consumers):
+            await self.queue.put(_END_OF_ITEMS)
+
+    async def _consume_items(self, emit):
+        # bounded mode worker: calls consumer(item) until it gets the end of items sentinel
+        while True:
+            self.metrics.observe_queue_depth(self.queue.qsize())
+            item = await self.queue.get()
+            self.queue.task_done()
+            if item is _END_OF_ITEMS:
+                return
+            if not self.max_per_host:
+                await emit(await self._process_item(item))
+                continue
+            try:
+                host = self.host_key(item)
+            except Exception as e:
+                # a bad item fails on its own instead of taking the worker down
+                self.metrics.record(0.0, succeeded=False)
+                await emit(e)
+                continue
+            if not await self._acquire_host(host, item):
+                # parked, a worker busy with this host will process it
+                continue
+            has_item = True
+            while has_item:
+                await emit(await self._process_item(item))
+                has_item, item = await self._release_host(host)
+
+    async def _acquire_host(self, host, item) -> bool:
+        """
+        Take one of host's max_per_host slots for item, returns False if the host is busy and item was parked
+         instead, so the worker can move on to other hosts' items
+        Parked items count against max_queue_size, past that the worker waits for the host's slot
+        """
+        if self._host_active.get(host, 0) >= self.max_per_host:
+            if not self.queue.maxsize or self._parked < self.queue.maxsize:
+                self._host_pending.setdefault(host, deque()).append(item)
+                self._parked += 1
+                return False
+            async with self._host_released:
+                await self._host_released.wait_for(lambda: self._host_active.get(host, 0) < self.max_per_host)
+        self._host_active[host] = self._host_active.get(host, 0) + 1
+        return True
+
+    async def _release_host(self, host):
+        """
+        Returns (True, item) with the next parked item of host, which keeps the slot,
+         or frees the slot and returns (False, None)
+        """
+        pending = self._host_pending.get(host)
+        if pending:
+            item = pending.popleft()
+            self._parked -= 1
+            if not pending:
+                del self._host_pending[host]
+            return True, item
+        self._host_active[host] -= 1
+        if not self._host_active[host]:
+            del self._host_active[host]
+        async with self._host_released:
+            self._host_released.notify_all()
+        return False, None
+
+    async def _process_item(self, item):
+        # returns consumer(item), or the last exception once retries run out
+        start = time.perf_counter()
+        for attempt in range(1, self.retries + 2):
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire()
+                if self.item_timeout:
+                    result = await asyncio.wait_for(self.consumer(item), self.item_timeout)
+                else:
+                    result = await self.consumer(item)
+                self.metrics.record(time.perf_counter() - start, succeeded=True)
+                return result
+            except Exception as e:
+                error = e
+                if isinstance(e, asyncio.TimeoutError):
+                    self.metrics.timeouts += 1
+                if attempt <= self.retries:
+                    self.metrics.retries += 1
+                    await asyncio.sleep(self.backoff_seconds * 2 ** (attempt - 1) * (0.5 + random.random()))
+        self.metrics.record(time.perf_counter() - start, succeeded=False)
+        return error
+
+    def get_metrics(self) -> dict:
+        """
+        Returns {'items', 'succeeded', 'failed', 'retries', 'timeouts', 'elapsed_seconds', 'items_per_second',
+         'queue_depth', 'max_queue_depth', 'out_queue_depth', 'latency_ms': {'p50', 'p90', 'p99', 'max'}}
+        latencies are per item, including waits for the rate limit and retries (not the time parked for a host)
+        """
+        return self.metrics.summary(self.queue.qsize(), self.out_queue.qsize())
+
+    async def _stop_after(self, tasks: list, queue: asyncio.Queue):
+        await asyncio.gather(*tasks)
+        await queue.put(_END_OF_ITEMS)
+
+    async def _run_cpu_stage(self, cpu_queue: asyncio.Queue, emit):
+        """
+        Batches consumer results from cpu_queue into the executor and emits cpu_stage results as batches finish
+         at most 2 batches per cpu worker are in flight, so the executor can't run far behind the consumers
+        """
+        loop = asyncio.get_running_loop()
+        if self.cpu_executor == "process":
+            executor = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.cpu_workers)
+        in_flight = set()
+
+        async def emit_batches(futures):
+            for future in futures:
+                in_flight.discard(future)
+                for result in future.result():
+                    await emit(result)
+
+        async def submit(batch):
+            if len(in_flight) >= 2 * self.cpu_workers:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                await emit_batches(done)
+            in_flight.add(loop.run_in_executor(executor, _apply_cpu_stage, self.cpu_stage, batch))
+
+        # waits for the next consumer result and the batches in flight together,
+        #  so finished batches are emitted right away even while no new results arrive
+        get_result = None
+        try:
+            batch = []
+            deadline = None
+            while True:
+                if get_result is None:
+                    get_result = asyncio.ensure_future(cpu_queue.get())
+                timeout = None
+                if batch and self.cpu_batch_timeout_ms is not None:
+                    timeout = max(deadline - loop.time(), 0)
+                done, _ = await asyncio.wait(
+                    {get_result, *in_flight}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                await emit_batches(done & in_flight)
+                if get_result not in done:
+                    if not done:
+                        # the batch window closed
+                        await submit(batch)
+                        batch = []
+                    continue
+                result = get_result.result()
+                get_result = None
+                if result is _END_OF_ITEMS:
+                    break
+                if isinstance(result, Exception):
+                    await emit(result)
+                    continue
+                if not batch and self.cpu_batch_timeout_ms is not None:
+                    deadline = loop.time() + self.cpu_batch_timeout_ms / 1000
+                batch.append(result)
+                if len(batch) >= self.cpu_batch_size:
+                    await submit(batch)
+                    batch = []
+            if batch:
+                await submit(batch)
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                await emit_batches(done)
+        finally:
+            if get_result is not None:
+                get_result.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_bounded(self, emit):
+        # emit(result) is awaited for every result, as soon as it is ready
+        print(f"Async starting with {self.number_of_consumers} (bounded queue of {self.queue.maxsize})")
+        self.metrics.started = time.monotonic()
+        self.metrics.finished = None
+        tasks = [asyncio.create_task(self._produce_then_stop())]
+        if self.cpu_stage is None:
+            tasks += [asyncio.create_task(self._consume_items(emit)) for _ in range(self.number_of_consumers)]
+        else:
+            cpu_queue = asyncio.Queue(maxsize=self.queue.maxsize)
+            workers = [asyncio.create_task(self._consume_items(cpu_queue.put)) for _ in range(self.number_of_consumers)]
+            tasks += workers
+            tasks.append(asyncio.create_task(self._stop_after(workers, cpu_queue)))
+            tasks.append(asyncio.create_task(self._run_cpu_stage(cpu_queue, emit)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self.metrics.finished = time.monotonic()
+            # only does something if the producer failed or run() was cancelled
+            for task in tasks:
+                task.cancel()
 
     async def run(self):
+        if self.bounded:
+            results = []
+
+            async def collect(result):
+                results.append(result)
+
+            await self._run_bounded(collect)
+            self.endpiointData = results
+            return self.endpiointData
+
         producer = asyncio.create_task(self.produce())
         await producer
         # consumers = self.consume(self.number_of_consumers)
@@ -62,3 +452,221 @@ class AsyncConsumer:
         )
 
         return self.endpiointData
+
+    async def _run_then_end_results(self):
+        cancelled = False
+        try:
+            if self.bounded:
+                await self._run_bounded(self.out_queue.put)
+            else:
+                # queue mode consumers put their results on out_queue themselves
+                await self.run()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                await self.out_queue.put(_END_OF_RESULTS)
+
+    async def stream(self, batch_size: int | None = None, batch_timeout_ms: float | None = None):
+        """
+        Run the consumers and yield their results from out_queue as they arrive
+         (instead of waiting for run() to return)
+
+        batch_size and/or batch_timeout_ms yield lists of results instead: a batch is yielded when it has
+         batch_size results or batch_timeout_ms after its first result, whichever comes first
+        In bounded mode out_queue holds at most max_queue_size results, so a slow reader slows the consumers down
+        An exception raised by the producer is raised here once the results before it have been yielded
+        """
+        batching = batch_size is not None or batch_timeout_ms is not None
+        loop = asyncio.get_running_loop()
+        runner = asyncio.create_task(self._run_then_end_results())
+        try:
+            batch = []
+            deadline = None
+            while True:
+                if batch and batch_timeout_ms is not None:
+                    try:
+                        result = await asyncio.wait_for(self.out_queue.get(), max(deadline - loop.time(), 0))
+                    except asyncio.TimeoutError:
+                        yield batch
+                        batch = []
+                        continue
+                else:
+                    result = await self.out_queue.get()
+                if result is _END_OF_RESULTS:
+                    break
+                if not batching:
+                    yield result
+                    continue
+                if not batch and batch_timeout_ms is not None:
+                    deadline = loop.time() + batch_timeout_ms / 1000
+                batch.append(result)
+                if batch_size is not None and len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            await runner
+        finally:
+            # stops the consumers if the caller stopped iterating early
+            runner.cancel()
+
+
+def _run_shard(number_of_consumers: int, consumer, items: list, use_uvloop: bool, consumer_kwargs: dict):
+    # runs in a worker process: one AsyncConsumer on its own event loop
+    if use_uvloop and uvloop is not None:
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        async_consumer = AsyncConsumer(number_of_consumers, consumer, items, **consumer_kwargs)
+        results = loop.run_until_complete(async_consumer.run())
+        return results, async_consumer.get_metrics()
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class ShardedAsyncConsumer:
+    """
+    Runs an AsyncConsumer in each of number_of_processes processes, each on a round-robin shard of items,
+     for when a single event loop is the bottleneck
+    consumer must be a module level function (it is pickled to the processes), as are items and results
+    the other arguments are passed to each AsyncConsumer (e.g., bounded=True, rate_limit=...),
+     so limits apply per process: rate_limit=100 with 4 processes allows 400 items per second
+    the event loops use uvloop when it is installed (pip install uvloop) and use_uvloop is True
+
+        results = await ShardedAsyncConsumer(4, 100, poll, endpoints, bounded=True).run()
+
+    run() returns the same as AsyncConsumer.run(), the results of shard 0 first, then shard 1, ...
+     a shard that fails as a whole is returned as its exception (its shard_metrics entry is None)
+    shard_metrics has the AsyncConsumer.get_metrics() of each shard after run()
+    """
+
+    def __init__(
+        self, number_of_processes: int, number_of_consumers: int, consumer, items, use_uvloop: bool = True, **consumer_kwargs
+    ):
+        if hasattr(items, "__aiter__"):
+            raise Exception("ShardedAsyncConsumer needs items that can be sent to other processes, not an async iterable")
+        self.number_of_processes = number_of_processes
+        self.number_of_consumers = number_of_consumers
+        self.consumer = consumer
+        self.items = items
+        self.use_uvloop = use_uvloop
+        self.consumer_kwargs = consumer_kwargs
+        self.shard_metrics = []
+        self.endpiointData = []
+
+    def shards(self) -> list:
+        if isinstance(self.items, collections.abc.Sequence):
+            return [list(self.items[i :: self.number_of_processes]) for i in range(self.number_of_processes)]
+        shards = [[] for _ in range(self.number_of_processes)]
+        for i, item in enumerate(self.items):
+            shards[i % self.number_of_processes].append(item)
+        return shards
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        print(f"Sharded async starting with {self.number_of_processes} processes")
+        executor = ProcessPoolExecutor(max_workers=self.number_of_processes)
+        try:
+            shard_results = await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        executor,
+                        _run_shard,
+                        self.number_of_consumers,
+                        self.consumer,
+                        shard,
+                        self.use_uvloop,
+                        self.consumer_kwargs,
+                    )
+                    for shard in self.shards()
+                ],
+                return_exceptions=True,
+            )
+        except BaseException:
+            # cancelled: don't block the event loop waiting for the other shards
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        # every shard is done, this doesn't wait
+        executor.shutdown(wait=False)
+        self.endpiointData = []
+        self.shard_metrics = []
+        for shard_result in shard_results:
+            if isinstance(shard_result, BaseException):
+                # a shard that failed as a whole (e.g., a consumer that can't be pickled) is returned
+                #  as its exception, like AsyncConsumer.run() does for a failed consumer
+                self.endpiointData.append(shard_result)
+                self.shard_metrics.append(None)
+            else:
+                results, metrics = shard_result
+                self.endpiointData += results
+                self.shard_metrics.append(metrics)
+        return self.endpiointData
+
+
+def _benchmark_response(size: int) -> bytes:
+    return json.dumps([{"id": i, "in_octets": i * 7, "out_octets": i * 3} for i in range(size)]).encode("utf-8")
+
+
+def _benchmark_parse(response: bytes) -> int:
+    # CPU bound stand-in for parsing/transforming an endpoint response
+    return sum(row["in_octets"] + row["out_octets"] for row in json.loads(response))
+
+
+def benchmark_cpu_stage(
+    number_of_items: int = 200,
+    number_of_consumers: int = 50,
+    io_seconds: float = 0.01,
+    response_size: int = 5000,
+    modes: list | None = None,
+    cpu_batch_size: int = 8,
+) -> list:
+    """
+    Compare a consumer that parses its responses on the event loop ('async') with the hybrid modes
+     that hand parsing to a process pool ('process') or a thread pool ('thread')
+    each item waits io_seconds (simulated request) and returns a JSON response of response_size rows
+
+    Returns a list of {'mode', 'seconds', 'items_per_second'}
+    """
+    if modes is None:
+        modes = ["async", "thread", "process"]
+    response = _benchmark_response(response_size)
+    results = []
+    for mode in modes:
+
+        async def request(item):
+            await asyncio.sleep(io_seconds)
+            return response
+
+        async def request_and_parse(item):
+            return _benchmark_parse(await request(item))
+
+        if mode == "async":
+            async_consumer = AsyncConsumer(number_of_consumers, request_and_parse, range(number_of_items), bounded=True)
+        else:
+            async_consumer = AsyncConsumer(
+                number_of_consumers,
+                request,
+                range(number_of_items),
+                bounded=True,
+                cpu_stage=_benchmark_parse,
+                cpu_executor=mode,
+                cpu_batch_size=cpu_batch_size,
+            )
+        start = time.perf_counter()
+        outputs = asyncio.run(async_consumer.run())
+        seconds = time.perf_counter() - start
+        if any(isinstance(output, Exception) for output in outputs):
+            raise Exception(f"benchmark mode '{mode}' failed: {outputs}")
+        results.append({"mode": mode, "seconds": round(seconds, 3), "items_per_second": round(number_of_items / seconds, 1)})
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'mode':<8} {'seconds':>8} {'items/s':>9}")
+    for result in benchmark_cpu_stage():
+        print(f"{result['mode']:<8} {result['seconds']:>8} {result['items_per_second']:>9}")
@@ -1,12 +1,36 @@
-import sys, path
+import os, sys, path
+import bz2
+import json
+import math
+import gzip
+import lzma
+import time
 import pytest
 
 sys.path.append(path.Path(__file__).parent.abspath())  # for importing log_tools
 from log_tools import log_exceptions, setup_logger
+import json_tools
+import compression_tools
+from compression_tools import ALL_CODECS, CompressionCodec
 from file_tools import (
     strip_path_characters,
     separate_path_elements,
     separate_and_strip_path_elements,
+    gzip_file,
+    gzip_files,
+    to_gzip_file,
+    iter_jsonl_file,
+    to_jsonl_file,
+    load_json_file,
+    to_json_file,
+    get_yaml_settings,
+    reload_settings,
+    FileIndex,
+    get_newest_file_of_type_in_folder,
+    get_newest_file_of_each_type_in_folder,
+    FileCatalog,
+    cleanup_files,
+    apply_retention,
 )
 
 
@@ -88,6 +112,392 @@ def test_separate_and_strip_path_elements():
     assert result == expected_result
 
 
+def test_gzip_files_parallel(tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    source_filepaths = []
+    for i in range(4):
+        src_filepath = tmp_path / f"export_{i}_2024_01_01.json"
+        src_filepath.write_text(f'{{"id": {i}}}')
+        source_filepaths.append(str(src_filepath))
+    already_compressed = tmp_path / "archive_2024_01_01.json.gz"
+    already_compressed.write_bytes(gzip.compress(b"{}"))
+    source_filepaths.append(str(already_compressed))
+    source_filepaths.append(str(tmp_path / "missing_2024_01_01.json"))
+
+    result = gzip_files(source_filepaths, str(out_dir), max_workers=2)
+
+    assert len(result) == len(source_filepaths)
+    for i in range(4):
+        assert result[i] == str(out_dir / f"export_{i}_2024_01_01.json.gz")
+        with gzip.open(result[i], "rt") as f:
+            assert f.read() == f'{{"id": {i}}}'
+    assert result[4] == str(out_dir / "archive_2024_01_01.json.gz")
+    assert isinstance(result[5], FileNotFoundError)
+
+
+def test_gzip_file_chunked(tmp_path):
+    src_filepath = tmp_path / "big_log_2024_01_01.txt"
+    data = b"".join(f"line {i} of a large log export\n".encode() for i in range(20000))
+    src_filepath.write_bytes(data)
+
+    dst_filepath = gzip_file(str(src_filepath), str(tmp_path), chunk_size=64 * 1024, max_workers=4)
+
+    assert dst_filepath == str(tmp_path / "big_log_2024_01_01.txt.gz")
+    with gzip.open(dst_filepath, "rb") as f:
+        assert f.read() == data
+
+
+def test_gzip_file_codecs(tmp_path):
+    src_filepath = tmp_path / "export_2024_01_01.json"
+    data = b'{"hostname": "endpoint-000001"}\n' * 1000
+    src_filepath.write_bytes(data)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    for codec, extension, decompress in [
+        ("gzip", ".gz", gzip.decompress),
+        ("bz2", ".bz2", bz2.decompress),
+        ("xz", ".xz", lzma.decompress),
+    ]:
+        dst_filepath = gzip_file(str(src_filepath), str(out_dir), codec=codec, level=1)
+        assert dst_filepath == str(out_dir / f"export_2024_01_01.json{extension}")
+        with open(dst_filepath, "rb") as f:
+            assert decompress(f.read()) == data
+        # already compressed files are copied, not compressed again
+        assert gzip_file(dst_filepath, str(tmp_path)) == str(tmp_path / f"export_2024_01_01.json{extension}")
+
+    # chunked compression only for codecs whose concatenated members decode to the joined data
+    assert [name for name, codec in ALL_CODECS.items() if codec.supports_concatenation] == ["gzip", "bz2", "xz"]
+    with pytest.raises(TypeError):
+        CompressionCodec()
+
+    written = to_gzip_file("some text", str(tmp_path / "text_2024_01_01.txt"), codec="xz")
+    assert written == str(tmp_path / "text_2024_01_01.txt.xz")
+    with open(written, "rb") as f:
+        assert lzma.decompress(f.read()) == b"some text"
+
+
+def test_jsonl_round_trip(tmp_path):
+    def generate_records():
+        for i in range(2500):
+            yield {"hostname": f"endpoint-{i}", "up": i % 2 == 0}
+
+    for filename in ["endpoints_2024_01_01.jsonl", "endpoints_2024_01_01.jsonl.gz"]:
+        filepath = str(tmp_path / filename)
+        assert to_jsonl_file(generate_records(), filepath, batch_size=100) == 2500
+        assert to_jsonl_file([{"hostname": "extra"}], filepath, append=True) == 1
+        records = list(iter_jsonl_file(filepath))
+        assert records[:2500] == list(generate_records())
+        assert records[-1] == {"hostname": "extra"}
+
+
+def test_jsonl_append_needs_concatenation(tmp_path, monkeypatch):
+    # the check happens before the file is opened, so this runs without zstandard installed
+    monkeypatch.setitem(compression_tools.CODECS, "zstd", ALL_CODECS["zstd"])
+    with pytest.raises(Exception, match="Cannot append"):
+        to_jsonl_file([{"hostname": "extra"}], str(tmp_path / "endpoints_2024_01_01.jsonl.zst"), append=True)
+    assert not (tmp_path / "endpoints_2024_01_01.jsonl.zst").exists()
+
+
+def _endpoint_payload(records: int = 5000) -> list:
+    return [
+        {
+            "hostname": f"endpoint-{i:06d}.example.com",
+            "status": "up" if i % 7 else "down",
+            "uptime_seconds": i * 37,
+            "load": [i * 0.5, i * 0.25, i * 0.125],
+            "interfaces": [{"name": f"eth{n}", "in_octets": i * n} for n in range(3)],
+        }
+        for i in range(records)
+    ]
+
+
+def test_json_file_round_trip(tmp_path):
+    payload = _endpoint_payload(100)
+    for compact in [False, True]:
+        filepath = str(tmp_path / f"endpoints_{compact}_2024_01_01.json")
+        to_json_file(payload, filepath, compact=compact)
+        assert load_json_file(filepath) == payload
+    # pretty output is unchanged from the stdlib indent=4 format
+    with open(str(tmp_path / "endpoints_False_2024_01_01.json")) as f:
+        assert f.read() == json.dumps(payload, indent=4)
+
+    # compact output is utf-8 whatever the locale encoding
+    filepath = str(tmp_path / "sites_2024_01_01.json")
+    to_json_file({"site": "Zürich"}, filepath, compact=True)
+    with open(filepath, "rb") as f:
+        assert "Zürich".encode("utf-8") in f.read()
+    assert load_json_file(filepath) == {"site": "Zürich"}
+
+
+def test_json_round_trip_big_ints_and_nan(tmp_path):
+    payload = {"big": 2**70, "negative_big": -(2**65), "nan": float("nan"), "inf": float("inf")}
+    filepath = str(tmp_path / "values_2024_01_01.json")
+    to_json_file(payload, filepath)
+    loaded = load_json_file(filepath)
+    assert loaded["big"] == 2**70 and type(loaded["big"]) is int
+    assert loaded["negative_big"] == -(2**65)
+    assert math.isnan(loaded["nan"])
+    assert loaded["inf"] == float("inf")
+
+    filepath = str(tmp_path / "values_2024_01_01.jsonl")
+    to_jsonl_file([{"big": 2**70}, {"values": [float("nan"), float("-inf")], "none": None}], filepath)
+    records = list(iter_jsonl_file(filepath))
+    assert records[0] == {"big": 2**70}
+    assert math.isnan(records[1]["values"][0])
+    assert records[1]["values"][1] == float("-inf")
+    assert records[1]["none"] is None
+
+
+def test_json_backend_benchmark():
+    # run with 'pytest -s' to see the timings
+    payload = _endpoint_payload()
+    original_backend = json_tools.JSON_BACKEND
+    try:
+        for backend in json_tools.JSON_BACKENDS:
+            json_tools.set_json_backend(backend)
+            start = time.perf_counter()
+            for _ in range(5):
+                data = json_tools.json_dumps_bytes(payload)
+            dumps_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(5):
+                loaded = json_tools.json_loads(data, fast=True)
+            loads_time = time.perf_counter() - start
+            assert loaded == payload
+            print(f"{backend:<8} dumps: {dumps_time:.4f}s loads: {loads_time:.4f}s")
+    finally:
+        json_tools.set_json_backend(original_backend)
+
+
+def test_yaml_settings_cache(tmp_path):
+    settings_filepath = tmp_path / "settings.yml"
+    settings_filepath.write_text('prefix_delimiter: "_20"\n')
+    settings = get_yaml_settings(str(tmp_path), "settings.yml")
+    assert settings == {"prefix_delimiter": "_20"}
+    # cached until the file changes, each caller gets its own copy
+    settings["prefix_delimiter"] = "changed"
+    assert get_yaml_settings(str(tmp_path), "settings.yml") == {"prefix_delimiter": "_20"}
+
+    settings_filepath.write_text('prefix_delimiter: "_19"\nextra: 1\n')
+    os.utime(settings_filepath, ns=(0, 1_000_000_000))
+    assert get_yaml_settings(str(tmp_path), "settings.yml") == {"prefix_delimiter": "_19", "extra": 1}
+
+    reloaded = reload_settings(str(tmp_path), "settings.yml")
+    assert reloaded == {"prefix_delimiter": "_19", "extra": 1}
+    assert reloaded is not settings
+
+
+def _create_dated_files(folder, names_and_mtimes):
+    for name, mtime in names_and_mtimes:
+        filepath = folder / name
+        filepath.write_text(name)
+        os.utime(filepath, (mtime, mtime))
+
+
+def test_file_index(tmp_path):
+    _create_dated_files(
+        tmp_path,
+        [
+            ("report_2024_01_01.json", 100),
+            ("report_2024_01_02.json", 300),
+            ("report_2024_01_03.json", 200),
+            ("report_2024_01_02.csv", 50),
+            ("report_detail_2024_01_01.json", 400),
+            ("notes.txt", 10),
+            (".hidden_2024_01_01.json", 999),
+        ],
+    )
+    (tmp_path / "subdir_2024_01_01.json").mkdir()
+
+    file_index = FileIndex(str(tmp_path), prefix_delimiter="_20")
+    assert sorted(file_index.file_types()) == [
+        ("notes", ".txt"),
+        ("report", ".csv"),
+        ("report", ".json"),
+        ("report_detail", ".json"),
+    ]
+    assert file_index.newest_file("report", ".json") == os.path.join(str(tmp_path), "report_2024_01_02.json")
+    assert [f.name for f in file_index.files_of_type_like("report_2024_12_31.json")] == [
+        "report_2024_01_02.json",
+        "report_2024_01_03.json",
+        "report_2024_01_01.json",
+    ]
+    assert sorted(get_newest_file_of_each_type_in_folder(str(tmp_path))) == sorted(
+        os.path.join(str(tmp_path), name)
+        for name in ["notes.txt", "report_2024_01_02.csv", "report_2024_01_02.json", "report_detail_2024_01_01.json"]
+    )
+
+
+def test_file_catalog(tmp_path):
+    folder = tmp_path / "output"
+    folder.mkdir()
+    _create_dated_files(
+        folder,
+        [
+            ("report_2024_01_01.json", 100),
+            ("report_2024_01_02.json", 300),
+            ("report_2024_01_03.json", 200),
+            ("status_2024_01_01.csv", 50),
+        ],
+    )
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite"), prefix_delimiter="_20")
+    assert catalog.refresh(str(folder)) is True
+    # unchanged folder is not rescanned
+    assert catalog.refresh(str(folder)) is False
+    assert catalog.newest_file(str(folder), "report", ".json") == str(folder / "report_2024_01_02.json")
+    assert sorted(catalog.newest_files(str(folder))) == [
+        str(folder / "report_2024_01_02.json"),
+        str(folder / "status_2024_01_01.csv"),
+    ]
+
+    # new files are picked up through the folder mtime
+    _create_dated_files(folder, [("report_2024_01_04.json", 400)])
+    os.utime(folder, ns=(0, 10**18))
+    assert catalog.newest_file(str(folder), "report", ".json") == str(folder / "report_2024_01_04.json")
+
+    # the catalog persists across instances
+    catalog.close()
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite"), prefix_delimiter="_20")
+    assert catalog.refresh(str(folder)) is False
+    assert [f.name for f in catalog.files_beyond_limit(str(folder), "report", ".json", keep=2)] == [
+        "report_2024_01_03.json",
+        "report_2024_01_01.json",
+    ]
+
+
+def test_file_catalog_in_watched_folder(tmp_path):
+    _create_dated_files(tmp_path, [("report_2024_01_01.json", 100)])
+    catalog = FileCatalog(str(tmp_path / ".file_catalog.sqlite"), prefix_delimiter="_20")
+    # the catalog's own writes don't make the folder look changed
+    assert [catalog.refresh(str(tmp_path)) for _ in range(4)] == [True, False, False, False]
+    assert catalog.newest_files(str(tmp_path)) == [str(tmp_path / "report_2024_01_01.json")]
+    catalog.close()
+    catalog = FileCatalog(str(tmp_path / ".file_catalog.sqlite"), prefix_delimiter="_20")
+    assert catalog.refresh(str(tmp_path)) is False
+
+    _create_dated_files(tmp_path, [("report_2024_01_02.json", 200)])
+    assert catalog.refresh(str(tmp_path)) is True
+    assert catalog.refresh(str(tmp_path)) is False
+
+
+def test_cleanup_files_with_catalog(tmp_path):
+    names_and_mtimes = [
+        ("report_2024_01_01.json", 100),
+        ("report_2024_01_02.json", 300),
+        ("report_2024_01_03.json", 200),
+        ("report_2024_01_04.json", 400),
+        ("report_detail_2024_01_01.json", 250),
+        ("report_2024_01_01.csv", 10),
+    ]
+    folder = tmp_path / "output"
+    globbed_folder = tmp_path / "globbed"
+    folder.mkdir()
+    globbed_folder.mkdir()
+    _create_dated_files(folder, names_and_mtimes)
+    _create_dated_files(globbed_folder, names_and_mtimes)
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite"), prefix_delimiter="_20")
+
+    # the catalog matches the same files as the glob 'report*.json'
+    newest_detail = [("report_detail_2024_01_05.json", 500)]
+    _create_dated_files(folder, newest_detail)
+    _create_dated_files(globbed_folder, newest_detail)
+    assert get_newest_file_of_type_in_folder(str(folder), "report_2024_01_05.json", catalog=catalog) == str(
+        folder / "report_detail_2024_01_05.json"
+    )
+    assert get_newest_file_of_type_in_folder(str(globbed_folder), "report_2024_01_05.json") == str(
+        globbed_folder / "report_detail_2024_01_05.json"
+    )
+
+    cleanup_files(str(folder), "report_2024_01_05.json", 3, catalog=catalog)
+    cleanup_files(str(globbed_folder), "report_2024_01_05.json", 3)
+
+    assert sorted(os.listdir(folder)) == sorted(os.listdir(globbed_folder)) == [
+        "report_2024_01_01.csv",
+        "report_2024_01_02.json",
+        "report_2024_01_04.json",
+        "report_detail_2024_01_05.json",
+    ]
+    # files_of_type() is still exactly one type
+    assert [f.name for f in catalog.files_of_type(str(folder), "report", ".json")] == [
+        "report_2024_01_04.json",
+        "report_2024_01_02.json",
+    ]
+    cleanup_files(str(folder), "report_2024_01_05.json", 1, catalog=catalog)
+    assert sorted(os.listdir(folder)) == ["report_2024_01_01.csv", "report_detail_2024_01_05.json"]
+    assert catalog.newest_file(str(folder), "report", ".json") is None
+
+
+def test_apply_retention(tmp_path, monkeypatch):
+    monkeypatch.setattr("file_tools.time.time", lambda: 10 * 86400)
+    output = tmp_path / "output"
+    logs = tmp_path / "logs"
+    output.mkdir()
+    logs.mkdir()
+    _create_dated_files(output, [(f"report_2024_01_0{day}.json", day * 86400) for day in range(1, 6)])
+    _create_dated_files(logs, [(f"job_2024_01_0{day}.log", day * 86400) for day in range(1, 6)])
+    (logs / "job_2024_01_05.log").write_text("x" * 100)
+    os.utime(logs / "job_2024_01_05.log", (5 * 86400, 5 * 86400))
+    policies = [
+        {"directories": [str(output)], "filenames": ["report_2024_12_31.json"], "keep": 2},
+        {"directory": str(logs), "filename": "job_2024_12_31.log", "max_age_days": 7.5, "max_total_bytes": 120},
+    ]
+
+    summary = apply_retention(policies, dry_run=True)
+    assert summary["files_deleted"] == 6
+    assert sorted(os.listdir(output)) == [f"report_2024_01_0{day}.json" for day in range(1, 6)]
+
+    summary = apply_retention(policies, max_workers=4)
+    assert summary["files_deleted"] == 6
+    assert summary["errors"] == {}
+    assert sorted(os.listdir(output)) == ["report_2024_01_04.json", "report_2024_01_05.json"]
+    # 2 days over age, then 100 + 18 bytes fit in the budget, the rest does not
+    assert sorted(os.listdir(logs)) == ["job_2024_01_04.log", "job_2024_01_05.log"]
+
+
+def test_apply_retention_matches_cleanup_files(tmp_path):
+    dated_files = [
+        ("report_2024_01_01.json", 100),
+        ("report_detail_2024_01_02.json", 200),
+        ("report_2024_01_03.json", 300),
+        ("report_2024_01_03.csv", 300),
+    ]
+    retention, cleanup = tmp_path / "retention", tmp_path / "cleanup"
+    for folder in [retention, cleanup]:
+        folder.mkdir()
+        _create_dated_files(folder, dated_files)
+
+    apply_retention([{"directory": str(retention), "filename": "report_2024_12_31.json", "keep": 1}])
+    cleanup_files(str(cleanup), "report_2024_12_31.json", 1)
+    assert sorted(os.listdir(retention)) == sorted(os.listdir(cleanup)) == [
+        "report_2024_01_03.csv",
+        "report_2024_01_03.json",
+    ]
+
+    # prefix_glob=False only matches exactly this type
+    _create_dated_files(retention, [("report_detail_2024_01_02.json", 200), ("report_2024_01_01.json", 100)])
+    policy = {"directory": str(retention), "filename": "report_2024_12_31.json", "keep": 1, "prefix_glob": False}
+    apply_retention([policy])
+    assert sorted(os.listdir(retention)) == [
+        "report_2024_01_03.csv",
+        "report_2024_01_03.json",
+        "report_detail_2024_01_02.json",
+    ]
+
+
+def test_apply_retention_missing_directory(tmp_path):
+    _create_dated_files(tmp_path, [(f"report_2024_01_0{day}.json", day * 86400) for day in range(1, 4)])
+    policies = [
+        {"directories": [str(tmp_path / "missing"), str(tmp_path)], "filename": "report_2024_12_31.json", "keep": 1}
+    ]
+
+    summary = apply_retention(policies, dry_run=True)
+    assert summary["deleted"] == [str(tmp_path / "report_2024_01_02.json"), str(tmp_path / "report_2024_01_01.json")]
+    apply_retention(policies)
+    assert os.listdir(tmp_path) == ["report_2024_01_03.json"]
+
+
 if __name__ == "__main__":
     # pytest -W ignore::UserWarning -v
     test_strip_path_characters()
@@ -0,0 +1,547 @@
+import sys, path
+import datetime
+import gzip
+import asyncio
+import os
+import types
+import pytest
+from azure.core.exceptions import ClientAuthenticationError, HttpResponseError, ResourceNotFoundError
+
+sys.path.append(path.Path(__file__).parent.abspath())
+import fileclient_adls
+import fileclient_adls_async
+from fileclient_adls import AdlsConnection, get_adls_connection, clear_adls_connections
+from fileclient_adls_async import AsyncAdlsConnection
+
+
+class FakeDownloader:
+    # in-memory stand-in for StorageStreamDownloader
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.size = len(data)
+
+    def chunks(self):
+        for offset in range(0, len(self.data), self.chunk_size):
+            yield self.data[offset : offset + self.chunk_size]
+
+    def readinto(self, stream):
+        for chunk in self.chunks():
+            stream.write(chunk)
+        return self.size
+
+
+class FakeFileClient:
+    # in-memory stand-in for DataLakeFileClient
+    def __init__(self, file_system, path_name):
+        self.file_system = file_system
+        self.path_name = path_name
+
+    def download_file(self, max_concurrency=1, **kwargs):
+        self.file_system.downloads += 1
+        return FakeDownloader(self.file_system.files[self.path_name], self.file_system.chunk_size)
+
+    def create_file(self, metadata=None, **kwargs):
+        self.file_system.files[self.path_name] = b""
+        self.file_system.metadata[self.path_name] = metadata or {}
+        self.file_system.uncommitted[self.path_name] = {}
+
+    def append_data(self, data, offset, length=None, **kwargs):
+        failures = self.file_system.fail_appends.get((self.path_name, offset), 0)
+        if failures:
+            self.file_system.fail_appends[(self.path_name, offset)] = failures - 1
+            raise ConnectionError(f"simulated failure appending {self.path_name} at {offset}")
+        self.file_system.appends += 1
+        self.file_system.uncommitted.setdefault(self.path_name, {})[offset] = bytes(data)
+
+    def flush_data(self, offset, **kwargs):
+        data = self.file_system.files[self.path_name]
+        pending = self.file_system.uncommitted.pop(self.path_name, {})
+        while len(data) < offset:
+            data += pending.pop(len(data))
+        self.file_system.files[self.path_name] = data
+
+    def get_file_properties(self, **kwargs):
+        if self.path_name not in self.file_system.files:
+            raise ResourceNotFoundError("file not found")
+        return types.SimpleNamespace(
+            size=len(self.file_system.files[self.path_name]), metadata=self.file_system.metadata.get(self.path_name, {})
+        )
+
+    def upload_data(self, data, overwrite=True, **kwargs):
+        failures = self.file_system.fail_uploads.get(self.path_name, 0)
+        if isinstance(failures, Exception):
+            raise failures
+        if failures:
+            self.file_system.fail_uploads[self.path_name] = failures - 1
+            raise ConnectionError(f"simulated failure uploading {self.path_name}")
+        if hasattr(data, "read"):
+            data = data.read()
+        self.file_system.files[self.path_name] = bytes(data)
+        self.file_system.metadata[self.path_name] = kwargs.get("metadata") or {}
+        self.file_system.modified[self.path_name] = datetime.datetime.now(datetime.timezone.utc)
+
+
+class FakeDirectoryClient:
+    # in-memory stand-in for DataLakeDirectoryClient
+    def __init__(self, file_system, path_name):
+        self.file_system = file_system
+        self.path_name = path_name.strip("/")
+        self.file_system_name = file_system.name
+
+    def get_file_client(self, file_name):
+        return FakeFileClient(self.file_system, f"{self.path_name}/{file_name}")
+
+    def delete_directory(self):
+        self.file_system.directories.discard(self.path_name)
+        for name in list(self.file_system.files):
+            if name.startswith(f"{self.path_name}/"):
+                del self.file_system.files[name]
+
+
+class FakePath:
+    # stand-in for PathProperties
+    def __init__(self, name, is_directory, content_length=0, last_modified=None):
+        self.name = name
+        self.is_directory = is_directory
+        self.content_length = content_length
+        self.last_modified = last_modified
+        self.etag = f"etag-{name}-{content_length}"
+
+
+class FakeFileSystemClient:
+    # in-memory stand-in for FileSystemClient
+    def __init__(self, name):
+        self.name = name
+        self.files = {}
+        self.metadata = {}
+        self.modified = {}
+        self.downloads = 0
+        self.listings = 0
+        self.creates = 0
+        self.appends = 0
+        self.fail_appends = {}
+        self.uncommitted = {}
+        self.directories = set()
+        self.fail_uploads = {}
+        self.chunk_size = 4 * 1024 * 1024
+
+    def get_directory_client(self, directory_path):
+        return FakeDirectoryClient(self, directory_path)
+
+    def create_directory(self, directory_path):
+        self.creates += 1
+        self.directories.add(directory_path.strip("/"))
+        return FakeDirectoryClient(self, directory_path)
+
+    def get_file_client(self, file_path):
+        return FakeFileClient(self, file_path.strip("/"))
+
+    def get_paths(self, path=None, recursive=True, **kwargs):
+        self.listings += 1
+        prefix = f"{path.strip('/')}/" if path else ""
+        directories = set()
+        paths = []
+        for name in sorted(self.files):
+            if not name.startswith(prefix):
+                continue
+            parts = name[len(prefix) :].split("/")
+            if not recursive and len(parts) > 1:
+                continue
+            for i in range(1, len(parts)):
+                directories.add(prefix + "/".join(parts[:i]))
+            last_modified = self.modified.get(name, datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+            paths.append(FakePath(name, False, len(self.files[name]), last_modified))
+        paths += [FakePath(directory, True) for directory in directories]
+        return sorted(paths, key=lambda path: path.name)
+
+
+class FakeServiceClient:
+    def __init__(self, account_url, credential, max_chunk_get_size=4 * 1024 * 1024, **kwargs):
+        self.file_systems = {}
+        self.max_chunk_get_size = max_chunk_get_size
+
+    def get_file_system_client(self, file_system):
+        file_system_client = self.file_systems.setdefault(file_system, FakeFileSystemClient(file_system))
+        file_system_client.chunk_size = self.max_chunk_get_size
+        return file_system_client
+
+
+@pytest.fixture
+def adls_conn(monkeypatch):
+    monkeypatch.setattr(fileclient_adls, "ClientSecretCredential", lambda *args, **kwargs: None)
+    monkeypatch.setattr(fileclient_adls, "DataLakeServiceClient", FakeServiceClient)
+    clear_adls_connections()
+    return AdlsConnection(
+        "tenant", "client", "secret", "https://account.dfs.core.windows.net/", "filesystem", download_chunk_size=1024
+    )
+
+
+def test_upload_directory(adls_conn, tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ["a_2024_01_01.json", "b_2024_01_01.json", "sub/c_2024_01_01.json", ".hidden"]:
+        (tmp_path / name).write_text(name)
+    file_system = adls_conn.file_system_client
+    file_system.fail_uploads = {"daily/b_2024_01_01.json": 2, "daily/sub/c_2024_01_01.json": 5}
+    directory_client = adls_conn.create_directory("daily")
+
+    manifest = adls_conn.upload_directory(
+        directory_client, str(tmp_path), recursive=True, max_workers=4, retries=2, backoff_seconds=0
+    )
+
+    assert [result["adls_filename"] for result in manifest] == [
+        "a_2024_01_01.json",
+        "b_2024_01_01.json",
+        "sub/c_2024_01_01.json",
+    ]
+    assert [result["status"] for result in manifest] == ["uploaded", "uploaded", "failed"]
+    assert [result["attempts"] for result in manifest] == [1, 3, 3]
+    assert file_system.files == {
+        "daily/a_2024_01_01.json": b"a_2024_01_01.json",
+        "daily/b_2024_01_01.json": b"b_2024_01_01.json",
+    }
+
+
+def test_upload_retries_only_transient_errors(adls_conn, tmp_path):
+    for name in ["auth.json", "busy.json", "ok.json"]:
+        (tmp_path / name).write_text(name)
+    server_busy = HttpResponseError("server busy")
+    server_busy.status_code = 503
+    file_system = adls_conn.file_system_client
+    file_system.fail_uploads = {"daily/auth.json": ClientAuthenticationError("bad secret"), "daily/busy.json": server_busy}
+    directory_client = adls_conn.get_directory("daily")
+
+    manifest = adls_conn.upload_files(
+        directory_client, str(tmp_path), ["missing.json", "auth.json", "busy.json", "ok.json"], retries=2, backoff_seconds=0
+    )
+
+    assert [(result["status"], result["attempts"]) for result in manifest] == [
+        ("failed", 1),
+        ("failed", 1),
+        ("failed", 3),
+        ("uploaded", 1),
+    ]
+    assert "bad secret" in manifest[1]["error"]
+
+
+def test_download_file_streaming(adls_conn, tmp_path):
+    data = b"".join(f"line {i}\n".encode() for i in range(5000))
+    file_system = adls_conn.file_system_client
+    file_system.files["daily/plain.txt"] = data
+    # two gzip members, like file_tools.gzip_file(chunk_size=...) writes
+    file_system.files["daily/log.txt.gz"] = gzip.compress(data[:20000]) + gzip.compress(data[20000:])
+    directory_client = adls_conn.get_directory("daily")
+
+    adls_conn.download_file_from_directory(directory_client, str(tmp_path), "plain.txt", "plain.txt")
+    assert (tmp_path / "plain.txt").read_bytes() == data
+
+    adls_conn.download_file_from_directory(
+        directory_client, str(tmp_path), "log.txt", "log.txt.gz", max_concurrency=4, decompress=True
+    )
+    assert (tmp_path / "log.txt").read_bytes() == data
+
+    # a truncated download is an error, not a short file
+    file_system.files["daily/cut.txt.gz"] = file_system.files["daily/log.txt.gz"][:-500]
+    with pytest.raises(EOFError):
+        adls_conn.download_file_from_directory(
+            directory_client, str(tmp_path), "cut.txt", "cut.txt.gz", decompress=True
+        )
+    file_system.files["daily/empty.txt.gz"] = b""
+    adls_conn.download_file_from_directory(directory_client, str(tmp_path), "empty.txt", "empty.txt.gz", decompress=True)
+    assert (tmp_path / "empty.txt").read_bytes() == b""
+
+
+def test_download_directory(adls_conn, tmp_path):
+    file_system = adls_conn.file_system_client
+    file_system.files = {
+        "daily/2024/a.json": b"a",
+        "daily/2024/01/b.json": b"bb",
+        "daily/2024/01/c.json": b"ccc",
+        "other/d.json": b"d",
+    }
+
+    manifest = adls_conn.download_directory("/daily/2024", str(tmp_path), max_workers=3)
+    assert sorted((result["adls_path"], result["status"]) for result in manifest) == [
+        ("daily/2024/01/b.json", "downloaded"),
+        ("daily/2024/01/c.json", "downloaded"),
+        ("daily/2024/a.json", "downloaded"),
+    ]
+    assert (tmp_path / "01" / "c.json").read_bytes() == b"ccc"
+    assert sorted(os.listdir(tmp_path / "01")) == ["b.json", "c.json"]
+
+    # only the changed file is downloaded again
+    file_system.files["daily/2024/01/b.json"] = b"changed"
+    file_system.downloads = 0
+    manifest = adls_conn.download_directory("daily/2024", str(tmp_path))
+    assert sorted((result["adls_path"], result["status"]) for result in manifest) == [
+        ("daily/2024/01/b.json", "downloaded"),
+        ("daily/2024/01/c.json", "skipped"),
+        ("daily/2024/a.json", "skipped"),
+    ]
+    assert file_system.downloads == 1
+    assert (tmp_path / "01" / "b.json").read_bytes() == b"changed"
+
+
+def test_listing_cache(adls_conn, capsys, tmp_path):
+    file_system = adls_conn.file_system_client
+    file_system.files = {"daily/a.json": b"a", "daily/sub/b.json": b"b"}
+
+    records = list(adls_conn.list_directory_contents("daily", recursive=True, print_tree=True))
+    assert [(record.name, record.is_directory) for record in records] == [
+        ("daily/a.json", False),
+        ("daily/sub", True),
+        ("daily/sub/b.json", False),
+    ]
+    assert capsys.readouterr().out.splitlines() == [
+        "---------------------------",
+        "[filesystem]/daily",
+        "  a.json",
+        "  /sub",
+        "    b.json",
+    ]
+    # the printed listing was cached and reused for the returned iterator
+    assert file_system.listings == 1
+    list(adls_conn.list_directory_contents("daily", recursive=True, print_tree=False))
+    assert file_system.listings == 1
+
+    # an upload through the connection invalidates the listing
+    directory_client = adls_conn.get_directory("daily")
+    (tmp_path / "c.json").write_text("c")
+    adls_conn.upload_file_to_directory(directory_client, str(tmp_path), "c.json")
+    records = list(adls_conn.list_directory_contents("daily", recursive=True, print_tree=False))
+    assert file_system.listings == 2
+    assert "daily/c.json" in [record.name for record in records]
+
+    # an abandoned iteration is not cached
+    next(iter(adls_conn.list_directory_contents("daily", print_tree=False, use_cache=False)))
+    list(adls_conn.list_directory_contents("daily", print_tree=False))
+    assert file_system.listings == 4
+
+
+def test_listing_printed_on_call(adls_conn, capsys):
+    file_system = adls_conn.file_system_client
+    file_system.files = {f"daily/{i}.json": b"x" for i in range(2)}
+    # too big for the listing cache
+    adls_conn.listing_cache_max_entries = 1
+
+    listing = adls_conn.list_directory_contents("daily", print_tree=True, print_list=True)
+    assert file_system.listings == 2
+    assert capsys.readouterr().out.splitlines() == [
+        "---------------------------",
+        "[filesystem]/daily",
+        "  0.json",
+        "  1.json",
+        "---------------------------",
+        "[filesystem]/daily",
+        "[filesystem]/daily/daily/0.json",
+        "[filesystem]/daily/daily/1.json",
+    ]
+
+    # the listing can be iterated any number of times, it is listed again but not printed again
+    records = list(listing)
+    assert [record.name for record in records] == ["daily/0.json", "daily/1.json"]
+    assert list(listing) == records
+    assert file_system.listings == 4
+    assert capsys.readouterr().out == ""
+
+
+def test_create_directory_cache(adls_conn):
+    file_system = adls_conn.file_system_client
+
+    directory_client = adls_conn.create_daily_folders("exports")
+    assert file_system.creates == 4
+    assert adls_conn.create_daily_folders("exports").path_name == directory_client.path_name
+    assert file_system.creates == 4
+
+    adls_conn.create_daily_folders("other", leaf_only=True)
+    assert file_system.creates == 5
+    # parents of a created leaf are known too
+    adls_conn.create_directory("/other")
+    assert file_system.creates == 5
+
+    adls_conn.delete_directory(adls_conn.get_directory("other"))
+    adls_conn.create_directory("other")
+    assert file_system.creates == 6
+
+
+def test_upload_large_file_resume(adls_conn, tmp_path):
+    data = os.urandom(10 * 1000 + 123)
+    (tmp_path / "big.bin").write_bytes(data)
+    file_system = adls_conn.file_system_client
+    # fail the 8th chunk: the first flush (chunks 1-3) and second flush (chunks 4-6) are committed
+    file_system.fail_appends = {("daily/big.bin", 7000): 1}
+    directory_client = adls_conn.get_directory("daily")
+    progress = []
+
+    with pytest.raises(ConnectionError):
+        adls_conn.upload_large_file_to_directory(
+            directory_client, str(tmp_path), "big.bin", chunk_size=1000, max_concurrency=2, chunks_per_flush=3
+        )
+    assert len(file_system.files["daily/big.bin"]) == 6000
+
+    file_system.appends = 0
+    committed = adls_conn.upload_large_file_to_directory(
+        directory_client,
+        str(tmp_path),
+        "big.bin",
+        chunk_size=1000,
+        max_concurrency=2,
+        chunks_per_flush=3,
+        progress_callback=lambda done, total: progress.append((done, total)),
+        resume=True,
+    )
+    assert committed == len(data)
+    assert file_system.files["daily/big.bin"] == data
+    assert file_system.appends == 5
+    assert progress == [(9000, len(data)), (len(data), len(data))]
+
+    # an unrelated remote file of the same name is replaced, not appended to
+    file_system.files["daily/big.bin"] = b"old export" * 10
+    file_system.metadata["daily/big.bin"] = {}
+    committed = adls_conn.upload_large_file_to_directory(
+        directory_client, str(tmp_path), "big.bin", chunk_size=1000, resume=True
+    )
+    assert committed == len(data)
+    assert file_system.files["daily/big.bin"] == data
+
+    # and so is a partial upload of an older version of the local file
+    file_system.files["daily/big.bin"] = data[:3000]
+    os.utime(tmp_path / "big.bin", ns=(0, 10**18))
+    adls_conn.upload_large_file_to_directory(directory_client, str(tmp_path), "big.bin", chunk_size=1000, resume=True)
+    assert file_system.files["daily/big.bin"] == data
+    assert file_system.metadata["daily/big.bin"] == {"upload_id": f"{len(data)}-{10**18}"}
+
+
+class AsyncFakeFileSystemClient:
+    # asyncio wrapper around FakeFileSystemClient, stand-in for the aio FileSystemClient
+    def __init__(self, file_system):
+        self.file_system = file_system
+
+    def get_directory_client(self, directory_path):
+        return AsyncFakeDirectoryClient(self.file_system.get_directory_client(directory_path))
+
+    async def create_directory(self, directory_path):
+        return AsyncFakeDirectoryClient(self.file_system.create_directory(directory_path))
+
+    async def get_paths(self, path=None, recursive=True, **kwargs):
+        for item in self.file_system.get_paths(path=path, recursive=recursive):
+            yield item
+
+
+class AsyncFakeDirectoryClient:
+    def __init__(self, directory_client):
+        self.directory_client = directory_client
+        self.path_name = directory_client.path_name
+
+    def get_file_client(self, file_name):
+        return AsyncFakeFileClient(self.directory_client.get_file_client(file_name))
+
+
+class AsyncFakeFileClient:
+    def __init__(self, file_client):
+        self.file_client = file_client
+
+    async def upload_data(self, data, overwrite=True, **kwargs):
+        self.file_client.upload_data(data, overwrite=overwrite)
+
+    async def download_file(self, max_concurrency=1, **kwargs):
+        download = self.file_client.download_file(max_concurrency=max_concurrency)
+
+        async def chunks():
+            for chunk in download.chunks():
+                yield chunk
+
+        return types.SimpleNamespace(chunks=chunks)
+
+
+class AsyncFakeServiceClient:
+    def __init__(self, account_url, credential, transport=None, max_chunk_get_size=4 * 1024 * 1024, **kwargs):
+        self.file_system = FakeFileSystemClient("filesystem")
+        self.file_system.chunk_size = max_chunk_get_size
+        self.transport = transport
+
+    def get_file_system_client(self, file_system):
+        return AsyncFakeFileSystemClient(self.file_system)
+
+    async def close(self):
+        pass
+
+
+class AsyncFakeCredential:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_async_adls_connection(monkeypatch, tmp_path):
+    monkeypatch.setattr(fileclient_adls_async, "ClientSecretCredential", AsyncFakeCredential)
+    monkeypatch.setattr(fileclient_adls_async, "DataLakeServiceClient", AsyncFakeServiceClient)
+    threaded_calls = []
+    to_thread = asyncio.to_thread
+
+    async def record_to_thread(function, *args):
+        threaded_calls.append(getattr(function, "__name__", function))
+        return await to_thread(function, *args)
+
+    monkeypatch.setattr(fileclient_adls_async.asyncio, "to_thread", record_to_thread)
+
+    async def run():
+        async with AsyncAdlsConnection(
+            "tenant", "client", "secret", "https://account.dfs.core.windows.net/", "filesystem", download_chunk_size=3
+        ) as adls_conn:
+            file_system = adls_conn.service_client.file_system
+            # like the sync client, proxies are taken from the environment
+            assert adls_conn.session.trust_env
+            directory_client = await adls_conn.create_directory("/daily/2024")
+            await adls_conn.create_directory("daily")
+            assert file_system.creates == 1
+            await asyncio.gather(
+                *[adls_conn.upload_data_to_directory(directory_client, f"{i}.json", f"data {i}") for i in range(5)]
+            )
+            size = await adls_conn.download_file_from_directory(directory_client, str(tmp_path), "3.json", "3.json")
+            assert size == 6
+            assert (tmp_path / "3.json").read_text() == "data 3"
+            # file I/O ran off the event loop, one write per chunk
+            assert threaded_calls == ["open", "write", "write", "close"]
+            names = [item.name async for item in adls_conn.list_directory_contents("daily", recursive=True)]
+            assert names == ["daily/2024"] + [f"daily/2024/{i}.json" for i in range(5)]
+        assert adls_conn.session is None
+
+    asyncio.run(run())
+
+
+def test_shared_connections(monkeypatch):
+    monkeypatch.setattr(fileclient_adls, "ClientSecretCredential", lambda *args: object())
+    monkeypatch.setattr(fileclient_adls, "DataLakeServiceClient", FakeServiceClient)
+    clear_adls_connections()
+    account_url = "https://account.dfs.core.windows.net/"
+
+    conn_a = get_adls_connection("tenant", "client", "secret", account_url, "filesystem-a")
+    assert get_adls_connection("tenant", "client", "secret", account_url, "filesystem-a") is conn_a
+    conn_b = get_adls_connection("tenant", "client", "secret", account_url, "filesystem-b")
+    assert conn_b is not conn_a
+    assert len(fileclient_adls._shared_credentials) == 1
+    assert len(fileclient_adls._shared_sessions) == 1
+    session = fileclient_adls._get_shared_session(account_url, 10)
+    assert session.get_adapter(account_url)._pool_maxsize == 10
+    # the same 32 KiB socket blocks as azure's default adapter
+    assert session.get_adapter(account_url).poolmanager.connection_pool_kw["blocksize"] == 32768
+    assert session.trust_env
+    clear_adls_connections()
+    assert get_adls_connection("tenant", "client", "secret", account_url, "filesystem-a") is not conn_a
+
+
+def test_upload_data_items(adls_conn):
+    file_system = adls_conn.file_system_client
+    file_system.fail_uploads = {"daily/item_3.json": 1}
+    directory_client = adls_conn.get_directory("daily")
+
+    items = ((f"item_{i}.json", f'{{"id": {i}}}') for i in range(20))
+    manifest = adls_conn.upload_data_items(directory_client, items, max_workers=3, backoff_seconds=0)
+
+    assert [result["adls_filename"] for result in manifest] == [f"item_{i}.json" for i in range(20)]
+    assert all(result["status"] == "uploaded" for result in manifest)
+    assert manifest[3]["attempts"] == 2
+    assert file_system.files["daily/item_7.json"] == b'{"id": 7}'
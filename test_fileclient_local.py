@@ -0,0 +1,95 @@
+import sys, path
+import gzip
+import os
+import time
+
+sys.path.append(path.Path(__file__).parent.abspath())
+from fileclient_adls import StorageBackend
+from fileclient_local import LocalStorageConnection
+
+
+def test_local_storage_round_trip(tmp_path):
+    storage = LocalStorageConnection(str(tmp_path / "remote"), download_chunk_size=1000)
+    assert isinstance(storage, StorageBackend)
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    for i in range(5):
+        (local_dir / f"export_{i}_2024_01_01.json").write_text(f'{{"id": {i}}}')
+    (local_dir / "big.log").write_bytes(b"log line\n" * 2000)
+
+    directory_client = storage.create_daily_folders("exports", leaf_only=True)
+    manifest = storage.upload_directory(directory_client, str(local_dir), max_workers=4)
+    assert [result["status"] for result in manifest] == ["uploaded"] * 6
+    storage.upload_large_file_to_directory(
+        directory_client, str(local_dir), "big.log", "big_chunked.log", chunk_size=700, chunks_per_flush=4
+    )
+    storage.upload_data_to_directory(directory_client, "big.log.gz", gzip.compress(b"log line\n" * 2000))
+
+    names = [item.name for item in storage.list_directory_contents("exports", recursive=True, print_tree=False)]
+    assert f"{directory_client.path_name}/big_chunked.log" in names
+    assert len([name for name in names if name.endswith(".json")]) == 5
+
+    mirror_dir = tmp_path / "mirror"
+    manifest = storage.download_directory("exports", str(mirror_dir))
+    assert sorted(result["status"] for result in manifest) == ["downloaded"] * 8
+    mirrored_files = {
+        os.path.relpath(os.path.join(root, file), mirror_dir) for root, _, files in os.walk(mirror_dir) for file in files
+    }
+    assert len(mirrored_files) == 8
+    storage.download_file_from_directory(directory_client, str(tmp_path), "big.log", "big.log.gz", decompress=True)
+    assert (tmp_path / "big.log").read_bytes() == b"log line\n" * 2000
+    # only the stand-in's own temp files are hidden, not files that happen to end in '.tmp'
+    storage.upload_data_to_directory(directory_client, "report.tmp", b"report")
+    (tmp_path / "remote" / "local" / directory_client.path_name / f"report.tmp.{'0' * 32}.tmp").write_bytes(b"")
+    names = [item.name for item in storage.list_directory_contents("exports", recursive=True, print_tree=False)]
+    assert [name.split("/")[-1] for name in names if ".tmp" in name] == ["report.tmp"]
+    manifest = storage.download_directory("exports", str(mirror_dir))
+    assert sorted(result["status"] for result in manifest) == ["downloaded"] + ["skipped"] * 8
+    assert (mirror_dir / directory_client.path_name.split("/", 1)[1] / "report.tmp").read_bytes() == b"report"
+
+
+def test_upload_skip_unchanged(tmp_path):
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    for i in range(4):
+        (local_dir / f"file_{i}.json").write_text(f'{{"id": {i}}}')
+    storage = LocalStorageConnection(str(tmp_path / "remote"))
+    directory_client = storage.create_directory("exports")
+
+    manifest = storage.upload_directory(directory_client, str(local_dir), skip_unchanged=True)
+    assert [result["status"] for result in manifest] == ["uploaded"] * 4
+
+    # a new connection sees the hashes stored with the files
+    storage = LocalStorageConnection(str(tmp_path / "remote"))
+    directory_client = storage.get_directory("exports")
+    (local_dir / "file_2.json").write_text('{"id": "changed"}')
+    manifest = storage.upload_directory(directory_client, str(local_dir), skip_unchanged=True)
+    assert [result["status"] for result in manifest] == ["skipped", "skipped", "uploaded", "skipped"]
+    assert (tmp_path / "remote" / "local" / "exports" / "file_2.json").read_text() == '{"id": "changed"}'
+    names = [item.name for item in storage.list_directory_contents("", recursive=True, print_tree=False)]
+    assert names == ["exports"] + [f"exports/file_{i}.json" for i in range(4)]
+
+    # an existing file with overwrite=False is a permanent error, it is not retried
+    manifest = storage.upload_files(directory_client, str(local_dir), ["file_0.json"], overwrite=False, backoff_seconds=0)
+    assert [(result["status"], result["attempts"]) for result in manifest] == [("failed", 1)]
+    assert "already exists" in manifest[0]["error"]
+
+
+def test_simulated_network_latency(tmp_path):
+    storage = LocalStorageConnection(str(tmp_path / "remote"), latency_seconds=0.02)
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    file_names = [f"file_{i}.txt" for i in range(16)]
+    for file_name in file_names:
+        (local_dir / file_name).write_text(file_name)
+    directory_client = storage.create_directory("latency")
+
+    start = time.perf_counter()
+    storage.upload_files(directory_client, str(local_dir), file_names, max_workers=1)
+    sequential_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    storage.upload_files(directory_client, str(local_dir), file_names, max_workers=16)
+    concurrent_seconds = time.perf_counter() - start
+
+    assert sequential_seconds >= 16 * 0.02
+    assert concurrent_seconds < sequential_seconds / 2
@@ -0,0 +1,303 @@
+import sys, path
+import asyncio
+import time
+import pytest
+
+sys.path.append(path.Path(__file__).parent.abspath())
+import othertools
+from othertools import AsyncConsumer
+
+
+def test_async_consumer_queue_mode():
+    async def consumer(queue, out_queue):
+        total = 0
+        while not queue.empty():
+            total += await queue.get()
+        return total
+
+    results = asyncio.run(AsyncConsumer(3, consumer, range(10)).run())
+    assert len(results) == 3
+    assert sum(results) == 45
+
+
+def test_async_consumer_bounded():
+    produced = []
+    first_result_at = []
+
+    async def items():
+        for i in range(50):
+            produced.append(i)
+            yield i
+
+    async def consumer(item):
+        await asyncio.sleep(0.001)
+        if not first_result_at:
+            first_result_at.append(len(produced))
+        if item == 7:
+            raise ValueError("bad item")
+        return item * 2
+
+    async def run():
+        async_consumer = AsyncConsumer(4, consumer, items(), bounded=True, max_queue_size=5)
+        results = await async_consumer.run()
+        assert async_consumer.queue.empty()
+        return results
+
+    results = asyncio.run(run())
+    assert len(results) == 50
+    errors = [result for result in results if isinstance(result, Exception)]
+    assert [str(error) for error in errors] == ["bad item"]
+    assert sorted(result for result in results if not isinstance(result, Exception)) == [
+        i * 2 for i in range(50) if i != 7
+    ]
+    # consumers started before the producer was done, and it never ran far ahead of them
+    assert first_result_at[0] <= 4 + 5 + 1
+
+
+def test_async_consumer_bounded_producer_error():
+    def items():
+        yield 1
+        raise RuntimeError("source failed")
+
+    async def consumer(item):
+        return item
+
+    with pytest.raises(RuntimeError, match="source failed"):
+        asyncio.run(AsyncConsumer(2, consumer, items(), bounded=True).run())
+
+
+def test_async_consumer_stream():
+    async def items():
+        for i in range(20):
+            await asyncio.sleep(0.001)
+            yield i
+
+    async def consumer(item):
+        return item
+
+    async def collect(async_consumer, **kwargs):
+        return [result async for result in async_consumer.stream(**kwargs)]
+
+    results = asyncio.run(collect(AsyncConsumer(3, consumer, items(), bounded=True)))
+    assert sorted(results) == list(range(20))
+
+    batches = asyncio.run(collect(AsyncConsumer(3, consumer, range(20), bounded=True), batch_size=8))
+    assert [len(batch) for batch in batches] == [8, 8, 4]
+
+    # results arrive every ~1ms, so a 500ms window is closed by batch_size and a 0ms window by time
+    batches = asyncio.run(collect(AsyncConsumer(1, consumer, items(), bounded=True), batch_size=5, batch_timeout_ms=500))
+    assert [len(batch) for batch in batches] == [5, 5, 5, 5]
+    batches = asyncio.run(collect(AsyncConsumer(1, consumer, items(), bounded=True), batch_timeout_ms=0))
+    assert sorted(sum(batches, [])) == list(range(20))
+    assert len(batches) > 1
+
+    # queue mode consumers put results on out_queue themselves
+    async def queue_consumer(queue, out_queue):
+        while not queue.empty():
+            await out_queue.put(await queue.get() * 10)
+
+    results = asyncio.run(collect(AsyncConsumer(2, queue_consumer, range(5))))
+    assert sorted(results) == [0, 10, 20, 30, 40]
+
+
+def test_async_consumer_stream_stops_early():
+    started = []
+
+    async def consumer(item):
+        started.append(item)
+        await asyncio.sleep(0.001)
+        return item
+
+    async def run():
+        async for result in AsyncConsumer(2, consumer, range(1000), bounded=True, max_queue_size=10).stream():
+            break
+
+    asyncio.run(run())
+    assert len(started) < 1000
+
+
+def test_async_consumer_limits():
+    running = {}
+    max_running = {}
+    attempts = {}
+
+    async def consumer(item):
+        host = item["host"]
+        running[host] = running.get(host, 0) + 1
+        max_running[host] = max(max_running.get(host, 0), running[host])
+        attempts[item["id"]] = attempts.get(item["id"], 0) + 1
+        try:
+            if item["id"] % 5 == 0 and attempts[item["id"]] == 1:
+                await asyncio.sleep(1)  # hangs the first time, cut by item_timeout
+            await asyncio.sleep(0.002)
+            return item["id"]
+        finally:
+            running[host] -= 1
+
+    items = [{"id": i, "host": f"host_{i % 3}"} for i in range(30)]
+    async_consumer = AsyncConsumer(
+        10,
+        consumer,
+        items,
+        bounded=True,
+        host_key=lambda item: item["host"],
+        max_per_host=2,
+        item_timeout=0.05,
+        retries=1,
+        backoff_seconds=0,
+    )
+    results = asyncio.run(async_consumer.run())
+
+    assert sorted(results) == list(range(30))
+    assert max(max_running.values()) == 2
+    assert async_consumer._host_active == async_consumer._host_pending == {}
+    metrics = async_consumer.get_metrics()
+    assert metrics["items"] == metrics["succeeded"] == 30
+    assert metrics["timeouts"] == metrics["retries"] == 6
+    assert metrics["latency_ms"]["p50"] <= metrics["latency_ms"]["p99"] <= metrics["latency_ms"]["max"]
+    assert metrics["latency_ms"]["max"] >= 50
+
+
+def test_async_consumer_busy_host_does_not_block_others():
+    started = {}
+
+    async def consumer(item):
+        started[item] = time.perf_counter()
+        await asyncio.sleep(0.03)
+        return item
+
+    items = [f"a{i}" for i in range(20)] + [f"b{i}" for i in range(5)]
+    async_consumer = AsyncConsumer(10, consumer, items, bounded=True, host_key=lambda item: item[0], max_per_host=1)
+    start = time.perf_counter()
+    results = asyncio.run(async_consumer.run())
+
+    assert sorted(results) == sorted(items)
+    # host b's first item starts right away instead of queueing behind host a's
+    assert started["b0"] - start < 0.03
+    # one at a time per host
+    a_starts = sorted(started[item] for item in items if item[0] == "a")
+    assert all(later - earlier >= 0.025 for earlier, later in zip(a_starts, a_starts[1:]))
+
+    # with no room to park (max_queue_size=1), workers wait for the host instead
+    async_consumer = AsyncConsumer(
+        4, consumer, items[:6], bounded=True, max_queue_size=1, host_key=lambda item: item[0], max_per_host=2
+    )
+    assert sorted(asyncio.run(async_consumer.run())) == items[:6]
+    assert async_consumer._parked == 0
+
+    # an item without a host key fails on its own, the other items are still processed
+    async_consumer = AsyncConsumer(2, consumer, ["a0", "", "b0"], bounded=True, host_key=lambda item: item[0], max_per_host=1)
+    results = asyncio.run(async_consumer.run())
+    assert sorted(result for result in results if isinstance(result, str)) == ["a0", "b0"]
+    assert [type(result) for result in results if not isinstance(result, str)] == [IndexError]
+    assert async_consumer.get_metrics()["failed"] == 1
+
+
+def test_async_consumer_rate_limit():
+    async def consumer(item):
+        return item
+
+    async_consumer = AsyncConsumer(8, consumer, range(21), bounded=True, rate_limit=200, rate_burst=1)
+    start = time.perf_counter()
+    asyncio.run(async_consumer.run())
+    # the first item uses the initial token, the other 20 wait 5ms each
+    assert time.perf_counter() - start >= 20 / 200 * 0.9
+    assert async_consumer.get_metrics()["items_per_second"] <= 200 * 1.1
+
+    with pytest.raises(Exception, match="bounded=True"):
+        AsyncConsumer(8, consumer, range(21), rate_limit=200)
+
+
+def _square(value):
+    if value == 13:
+        raise ValueError("unlucky")
+    return value * value
+
+
+def test_async_consumer_cpu_stage():
+    async def consumer(item):
+        await asyncio.sleep(0.001)
+        if item == 3:
+            raise ConnectionError("request failed")
+        return item
+
+    for cpu_executor in ["process", "thread"]:
+        async_consumer = AsyncConsumer(
+            5, consumer, range(40), bounded=True, cpu_stage=_square, cpu_executor=cpu_executor, cpu_workers=2, cpu_batch_size=4
+        )
+        results = asyncio.run(async_consumer.run())
+        assert len(results) == 40
+        errors = sorted(str(result) for result in results if isinstance(result, Exception))
+        assert errors == ["request failed", "unlucky"]
+        assert sorted(result for result in results if not isinstance(result, Exception)) == [
+            i * i for i in range(40) if i not in [3, 13]
+        ]
+
+    async def collect():
+        async_consumer = AsyncConsumer(2, consumer, range(5), bounded=True, cpu_stage=_square, cpu_executor="thread")
+        return [result async for result in async_consumer.stream()]
+
+    assert len(asyncio.run(collect())) == 5
+
+
+def test_async_consumer_cpu_stage_streams_finished_batches():
+    async def consumer(item):
+        if item == 1:
+            await asyncio.sleep(0.5)
+        return item
+
+    async def first_result_seconds():
+        async_consumer = AsyncConsumer(
+            2, consumer, range(2), bounded=True, cpu_stage=_square, cpu_executor="thread", cpu_batch_size=1
+        )
+        start = time.perf_counter()
+        async for result in async_consumer.stream():
+            assert result == 0
+            return time.perf_counter() - start
+
+    # item 0's batch is emitted as soon as it is done, not when item 1 arrives
+    assert asyncio.run(first_result_seconds()) < 0.25
+
+
+def test_cpu_stage_benchmark():
+    # run with 'pytest -s' to see the timings, or 'python othertools.py' for a bigger run
+    results = othertools.benchmark_cpu_stage(number_of_items=40, number_of_consumers=10, io_seconds=0.005, response_size=500)
+    assert [result["mode"] for result in results] == ["async", "thread", "process"]
+    for result in results:
+        print(result)
+        assert result["items_per_second"] > 0
+
+
+async def _double(item):
+    await asyncio.sleep(0.001)
+    return item * 2
+
+
+async def _drain(queue, out_queue):
+    total = 0
+    while not queue.empty():
+        total += await queue.get()
+    return total
+
+
+def test_sharded_async_consumer():
+    sharded = othertools.ShardedAsyncConsumer(3, 4, _double, range(50), bounded=True, max_queue_size=10)
+    results = asyncio.run(sharded.run())
+    assert sorted(results) == [i * 2 for i in range(50)]
+    assert [metrics["items"] for metrics in sharded.shard_metrics] == [17, 17, 16]
+
+    # queue mode: one return value per consumer per shard, like AsyncConsumer.run()
+    results = asyncio.run(othertools.ShardedAsyncConsumer(2, 3, _drain, iter(range(10))).run())
+    assert len(results) == 6
+    assert sum(results) == 45
+
+    # a mapping is sharded by its keys, like AsyncConsumer iterates it
+    sharded = othertools.ShardedAsyncConsumer(2, 2, _double, {i: f"host-{i}" for i in range(5)}, bounded=True)
+    assert sharded.shards() == [[0, 2, 4], [1, 3]]
+
+    # a shard that can't run shows up as its exception, the other shards' results are kept
+    sharded = othertools.ShardedAsyncConsumer(2, 2, _double, [0, lambda: None, 2, 3], bounded=True)
+    results = asyncio.run(sharded.run())
+    assert results[:2] == [0, 4]
+    assert len(results) == 3 and isinstance(results[2], Exception)
+    assert sharded.shard_metrics[1] is None